@@ -1,3 +1,4 @@
+from app import metrics, payload, profiling, startup
 from dash import (
     Dash,
     html,
@@ -8,8 +9,12 @@ from dash import (
     State,
 )
 import dash_bootstrap_components as dbc
-from app.config import TITLE, DESCRIPTION
+from app.config import STARTUP_REPORT, TITLE, DESCRIPTION
 
+startup.mark("imports")
+if STARTUP_REPORT:
+    startup.track_pages()
+profiling.start()
 
 app = Dash(
     __name__,
@@ -24,6 +29,10 @@ app = Dash(
     external_stylesheets=[dbc.themes.BOOTSTRAP],
 )
 server = app.server
+metrics.install(app)
+payload.install(app)
+profiling.install(app)
+startup.mark("pages")
 
 navbar = dbc.Navbar(
     dbc.Container(
@@ -134,6 +143,9 @@ app.layout = dbc.Container(
     fluid=True,
     className="px-0 background-gradient",
 )
+startup.mark("layout")
+if STARTUP_REPORT:
+    print(startup.report())
 
 if __name__ == "__main__":
     app.run_server(debug=True)
@@ -0,0 +1,58 @@
+/*
+ * Clientside version of `update_sources_chart` and `update_renewable_chart` in pages/energy_sources.py.
+ * The charts are redrawn here when the app is started with
+ * ENERGY_SOURCES_CLIENTSIDE=1 which adds the `ura-cube-store` payload to the
+ * page, otherwise the selection is passed on to the server callbacks.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    energy_sources: {
+        update_figures: function (location, date, payload) {
+            const no_update = window.dash_clientside.no_update;
+            if (!payload) {
+                const changed = window.dash_clientside.callback_context.triggered_id;
+                return [
+                    no_update,
+                    no_update,
+                    {location: location, date: date === undefined ? null : date, changed: changed},
+                ];
+            }
+
+            const kwh = payload.kwh[location];
+
+            function figure(name) {
+                const fig = JSON.parse(JSON.stringify(payload.figures[name]));
+                fig.layout.template = payload.template;
+                return fig;
+            }
+
+            let fig;
+            if (date === null || date === undefined) {
+                fig = figure("line");
+                fig.data.forEach(function (trace, i) {
+                    trace.y = kwh[i];
+                });
+            } else {
+                const index = payload.dates.indexOf(date);
+                fig = figure("pie");
+                fig.data[0].values = kwh.map(function (series) {
+                    return series[index];
+                });
+            }
+
+            const fig2 = figure("renewable");
+            fig2.data[0].y = payload.dates.map(function (_, index) {
+                let renewable = 0;
+                let total = 0;
+                kwh.forEach(function (series, i) {
+                    total += series[index];
+                    if (payload.renewable[i]) {
+                        renewable += series[index];
+                    }
+                });
+                return total ? renewable / total : null;
+            });
+
+            return [fig, fig2, no_update];
+        },
+    },
+});
@@ -0,0 +1,233 @@
+"""
+Cache of rendered Plotly figures.
+
+The page callbacks only ever draw a small, finite set of figures so each
+one is built once and kept as a plain dict keyed by (builder, arguments,
+dataset version). Figures live in an in-process LRU and, when a cache
+directory is configured, as JSON files on disk which every gunicorn
+worker can read; the files drawn from replaced data are removed when the
+data is reloaded. Figures rendered ahead of time by `python -m app.prerender`
+are read from the prerendered directory before anything is built.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Optional, Set, Tuple, Union
+
+import plotly.io as pio
+
+from app import metrics
+from app.payload import Precision, compact_figure, dumps, loads
+from app.config import FIGURE_CACHE_DIR, FIGURE_CACHE_SIZE, PRERENDER_DIR
+from app.data import LOADERS, add_reload_listener, dataset_version, pinned_snapshot
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    prerendered_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+
+class FigureCache:
+    def __init__(
+        self,
+        maxsize: int = 128,
+        directory: Optional[Union[str, Path]] = None,
+        prerendered: Optional[Union[str, Path]] = None,
+    ):
+        self.maxsize = maxsize
+        self.directory = Path(directory) if directory else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.prerendered = Path(prerendered) if prerendered else None
+        # (data version, manifest version) as of the last manifest read
+        self._prerendered_check: Optional[Tuple[str, str]] = None
+        self._figures: "OrderedDict[Hashable, dict]" = OrderedDict()
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Hashable, build: Callable[[], dict]) -> dict:
+        with self._lock:
+            figure = self._figures.get(key)
+            if figure is not None:
+                self._figures.move_to_end(key)
+                self._stats.hits += 1
+                return figure
+
+        figure = self._read(self._prerendered_directory(), key)
+        if figure is not None:
+            with self._lock:
+                self._stats.prerendered_hits += 1
+        else:
+            figure = self._read(self.directory, key)
+            if figure is not None:
+                with self._lock:
+                    self._stats.disk_hits += 1
+            else:
+                figure = build()
+                with self._lock:
+                    self._stats.misses += 1
+                if self.directory is not None:
+                    write_figure(figure_path(self.directory, key), figure)
+
+        with self._lock:
+            self._figures[key] = figure
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.maxsize:
+                self._figures.popitem(last=False)
+                self._stats.evictions += 1
+        return figure
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(asdict(self._stats), size=len(self._figures))
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+
+    def invalidate(self, is_stale: Callable[[Hashable], bool]):
+        """Drop the in-memory figures whose key `is_stale`."""
+        with self._lock:
+            for key in [key for key in self._figures if is_stale(key)]:
+                del self._figures[key]
+                self._stats.invalidations += 1
+
+    def remove_files(self, is_live: Callable[[str], bool]):
+        """Delete the figures on disk whose data version tag isn't `is_live`."""
+        if self.directory is None:
+            return
+        for path in self.directory.glob("*.json"):
+            if not is_live(path.name.split("-")[0]):
+                # another worker reloading at the same time may get there first
+                path.unlink(missing_ok=True)
+
+    def _prerendered_directory(self) -> Optional[Path]:
+        """
+        The prerendered figures directory if it was built from the current
+        data. The manifest is read again whenever the data version changes
+        so figures prerendered for new data are picked up after a reload.
+        """
+        if self.prerendered is None:
+            return None
+        version = dataset_version(*LOADERS)
+        check = self._prerendered_check
+        if check is None or check[0] != version:
+            try:
+                manifest = json.loads((self.prerendered / "manifest.json").read_text())
+                check = (version, manifest["version"])
+            except FileNotFoundError:
+                check = (version, "")
+            self._prerendered_check = check
+        if check[1] != version:
+            return None
+        return self.prerendered
+
+    @staticmethod
+    def _read(directory: Optional[Path], key: Hashable) -> Optional[dict]:
+        if directory is None:
+            return None
+        try:
+            return loads(figure_path(directory, key).read_bytes())
+        except (FileNotFoundError, ValueError):
+            return None
+
+
+def figure_path(directory: Path, key: Hashable) -> Path:
+    # keys are (builder, arguments, dataset names, dataset version), the
+    # version is tagged onto the name so figures of old data can be removed
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()
+    return directory / f"{version_tag(key[3])}-{digest}.json"
+
+
+def version_tag(version: str) -> str:
+    # versions join a hash per dataset so they're too long for a file name
+    return hashlib.sha256(version.encode()).hexdigest()[:16]
+
+
+def write_figure(path: Path, figure: dict):
+    # write to a temporary file first so other workers never read a partial figure
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(dumps(figure))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+figure_cache = FigureCache(
+    maxsize=FIGURE_CACHE_SIZE,
+    directory=FIGURE_CACHE_DIR,
+    prerendered=PRERENDER_DIR,
+)
+
+
+# the datasets of every cached builder, to tell which figures on disk are current
+_figure_datasets: Set[Tuple[str, ...]] = set()
+
+
+def _invalidate_stale_figures(old, new):
+    # keys are (builder, arguments, dataset names, dataset version)
+    figure_cache.invalidate(lambda key: key[3] != new.dataset_version(*key[2]))
+    live = {version_tag(new.dataset_version(*names)) for names in _figure_datasets}
+    figure_cache.remove_files(lambda tag: tag in live)
+
+
+add_reload_listener(_invalidate_stale_figures)
+
+
+def cached_figure(*datasets: str, precision: Precision = None):
+    """
+    Cache the figure returned by a builder function. The builder's result
+    is stored as a JSON compatible dict which is what the callbacks return.
+    `datasets` are the names of the datasets the figure is drawn from so
+    new data produces new figures. The traces are rounded to `precision`
+    decimals and compacted by `app.payload.compact_figure`.
+    """
+
+    _figure_datasets.add(datasets)
+
+    def decorator(builder):
+        name = f"{builder.__module__}.{builder.__qualname__}"
+        signature = inspect.signature(builder)
+
+        def key(*args, **kwargs):
+            # bind arguments so `f()` and `f("default")` share a cache entry
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = tuple(bound.arguments.items())
+            return (name, arguments, datasets, dataset_version(*datasets))
+
+        def render(*args, **kwargs) -> dict:
+            with metrics.timed("build"):
+                figure = builder(*args, **kwargs)
+            with metrics.timed("serialize"):
+                return compact_figure(loads(pio.to_json(figure)), precision)
+
+        @functools.wraps(builder)
+        def wrapper(*args, **kwargs):
+            # build from the same data the key's version was taken from
+            with pinned_snapshot():
+                return figure_cache.get_or_build(
+                    key(*args, **kwargs), lambda: render(*args, **kwargs)
+                )
+
+        wrapper.key = key
+        wrapper.render = render
+        wrapper.uncached = builder
+        return wrapper
+
+    return decorator
@@ -0,0 +1,193 @@
+"""
+Compiled binary copy of the app datasets.
+
+    python -m app.compiled            # compile the CSVs
+    python -m app.compiled --compare  # load time and RSS of both paths
+
+Every dataset is written column by column into a single file which the
+app memory-maps instead of parsing the CSVs. The datasets are typed by
+`app.schema` before they are written, so the numeric, categorical,
+period and nullable integer columns are used directly from the mapped
+pages and gunicorn workers share them; other text columns are stored as
+category codes. Each dataset records the hash of the CSV it was compiled
+from and `app.data` falls back to the CSV when the artifact is missing,
+out of date or written by an older version of this module.
+
+File layout: 8 byte magic, little endian uint64 header length, JSON
+header, then the column buffers each aligned to 64 bytes.
+"""
+import argparse
+import json
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+MAGIC = b"VEDATA02"
+ALIGNMENT = 64
+
+
+def _column_buffers(values: pd.Series) -> Tuple[dict, List[np.ndarray]]:
+    """How a column is stored, and the arrays holding it."""
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        meta = dict(kind="category", categories=list(dtype.categories))
+        return meta, [np.ascontiguousarray(values.cat.codes.to_numpy())]
+    if isinstance(dtype, pd.PeriodDtype):
+        meta = dict(kind="period", freq=dtype.freq.freqstr)
+        return meta, [np.ascontiguousarray(values.array.asi8)]
+    if isinstance(values.array, pd.arrays.IntegerArray):
+        array = values.array
+        arrays = [np.ascontiguousarray(array._data), np.ascontiguousarray(array._mask)]
+        return dict(kind="nullable"), arrays
+    if dtype == object:
+        codes, uniques = pd.factorize(values)
+        return dict(kind="object", categories=list(uniques)), [codes.astype(np.int32)]
+    return dict(kind="plain"), [np.ascontiguousarray(values.to_numpy())]
+
+
+def write_artifact(path: Path, datasets: Dict[str, Tuple[pd.DataFrame, str]]):
+    """Write `{name: (frame, source version)}` to `path` atomically."""
+    header = {}
+    buffers = []
+    offset = 0
+    for name, (frame, version) in datasets.items():
+        columns = []
+        for column in frame.columns:
+            meta, arrays = _column_buffers(frame[column])
+            meta.update(name=column, buffers=[])
+            for values in arrays:
+                offset = _align(offset)
+                meta["buffers"].append(dict(dtype=values.dtype.str, offset=offset))
+                buffers.append((offset, values.tobytes()))
+                offset += values.nbytes
+            columns.append(meta)
+        header[name] = dict(version=version, rows=len(frame), columns=columns)
+
+    header_bytes = json.dumps(header).encode()
+    start = _align(len(MAGIC) + 8 + len(header_bytes))
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            for buffer_offset, data in buffers:
+                f.seek(start + buffer_offset)
+                f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class Artifact:
+    def __init__(self, path: Path):
+        with path.open("rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a compiled data file")
+            (length,) = struct.unpack("<Q", f.read(8))
+            self.header = json.loads(f.read(length))
+        self.start = _align(len(MAGIC) + 8 + length)
+        self.buffer = np.memmap(path, dtype=np.uint8, mode="r")
+
+    def _view(self, buffer: dict, rows: int) -> np.ndarray:
+        dtype = np.dtype(buffer["dtype"])
+        start = self.start + buffer["offset"]
+        return self.buffer[start : start + dtype.itemsize * rows].view(dtype)
+
+    def frame(self, name: str, version: str) -> Optional[pd.DataFrame]:
+        """The compiled dataset or None when it was compiled from other data."""
+        meta = self.header.get(name)
+        if meta is None or meta["version"] != version:
+            return None
+        columns = {}
+        for column in meta["columns"]:
+            arrays = [self._view(buffer, meta["rows"]) for buffer in column["buffers"]]
+            kind = column["kind"]
+            # the typed columns wrap the mapped arrays without copying them
+            if kind == "category":
+                values = pd.Categorical.from_codes(
+                    arrays[0], categories=column["categories"]
+                )
+            elif kind == "period":
+                values = pd.arrays.PeriodArray(
+                    arrays[0], dtype=pd.PeriodDtype(column["freq"])
+                )
+            elif kind == "nullable":
+                values = pd.arrays.IntegerArray(*arrays)
+            elif kind == "object":
+                # code -1 (missing) picks the trailing NaN
+                categories = np.array(column["categories"] + [np.nan], dtype=object)
+                values = categories[arrays[0]]
+            else:
+                values = arrays[0]
+            columns[column["name"]] = values
+        return pd.DataFrame(columns, copy=False)
+
+
+def open_artifact(path: Path) -> Optional[Artifact]:
+    try:
+        return Artifact(path)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def compile_datasets(path: Path):
+    from app.data import APP_DIR, LOADERS, file_hash
+    from app.schema import apply_schema
+
+    datasets = {}
+    for name, (filename, loader) in LOADERS.items():
+        source = APP_DIR / filename
+        datasets[name] = (apply_schema(name, loader(source)), file_hash(source))
+    write_artifact(path, datasets)
+
+
+def compare():
+    """Print the `python -m app.data` report for the CSV and compiled paths."""
+    for source in ("csv", "compiled"):
+        env = dict(os.environ, APP_DATA_SOURCE=source)
+        result = subprocess.run(
+            [sys.executable, "-m", "app.data"],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        print(f"== {source}")
+        print(result.stdout)
+
+
+def main():
+    from app.config import COMPILED_DATA_FILE
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", type=Path, default=Path(COMPILED_DATA_FILE))
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="report load time and RSS of the CSV and compiled paths",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare()
+        return
+    compile_datasets(args.output)
+    print(f"Compiled datasets to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
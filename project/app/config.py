@@ -1,6 +1,72 @@
+import logging
+import os
+from pathlib import Path
+
 TITLE = "Vanuatu Energy Dashboard"
 DESCRIPTION = "An open source dashboard on Vanuatu's eneregy sources and prices from information obtained in public records."
 
+# directory containing the CSV files the app displays
+APP_DIR = Path(__file__).parent
+
 # chart labels and colors for URA market snapshots
 SOURCE_LABELS = ["diesel", "copra oil", "hydro", "solar", "wind"]
 SOURCE_COLORS = ["#1D1E18", "#D9FFF5", "#B9F5D8", "#AAD2BA", "#6B8F71"]
+
+# binary copy of the CSVs built by `python -m app.compiled`; set
+# APP_DATA_SOURCE=csv to always parse the CSVs instead
+COMPILED_DATA_FILE = os.environ.get("COMPILED_DATA_FILE", APP_DIR / "compiled-data.bin")
+APP_DATA_SOURCE = os.environ.get("APP_DATA_SOURCE", "auto")
+# "sqlite" leaves the datasets in the database built by `python -m app.database`
+# and reads them on demand instead of loading them into every worker
+APP_DATA_BACKEND = os.environ.get("APP_DATA_BACKEND", "pandas")
+SQLITE_DATA_FILE = os.environ.get("SQLITE_DATA_FILE", APP_DIR / "energy-data.sqlite")
+
+# seconds between checks for changed CSVs, 0 disables reloading data
+DATA_RELOAD_INTERVAL = float(os.environ.get("DATA_RELOAD_INTERVAL", 0))
+
+# figure cache shared by the page callbacks; set FIGURE_CACHE_DIR to share
+# rendered figures between gunicorn workers on disk
+FIGURE_CACHE_SIZE = int(os.environ.get("FIGURE_CACHE_SIZE", 128))
+FIGURE_CACHE_DIR = os.environ.get("FIGURE_CACHE_DIR")
+# figures rendered ahead of time with `python -m app.prerender`
+PRERENDER_DIR = os.environ.get("PRERENDER_DIR", APP_DIR / "prerendered")
+
+# redraw the energy sources charts in the browser instead of with a server callback
+ENERGY_SOURCES_CLIENTSIDE = os.environ.get("ENERGY_SOURCES_CLIENTSIDE", "").lower() in (
+    "1",
+    "true",
+)
+
+# print a breakdown of the time spent importing the app and its pages
+STARTUP_REPORT = os.environ.get("STARTUP_REPORT", "").lower() in ("1", "true")
+
+# record callback timings, served on /metrics and as Server-Timing headers
+METRICS = os.environ.get("METRICS", "").lower() in ("1", "true")
+
+# profile a sample of requests with cProfile and tracemalloc, writing the
+# results and a startup memory breakdown to PROFILE_DIR
+PROFILE = os.environ.get("PROFILE", "").lower() in ("1", "true")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.1))
+
+# compress responses with brotli or gzip, turn off when a proxy already does
+COMPRESS = os.environ.get("COMPRESS", "1").lower() in ("1", "true")
+
+# draw the energy prices from daily oil prices and exchange rates, downsampled
+# to DAILY_MAX_POINTS per trace and redrawn at full resolution when zoomed in;
+# needs `python scripts/fetchWtiDaily.py` (and DAILY_PRICES set when compiling)
+DAILY_PRICES = os.environ.get("DAILY_PRICES", "").lower() in ("1", "true")
+DAILY_DATA_FILES = ("crude-oil-wti-daily.csv", "exchange-rates-daily.csv")
+if DAILY_PRICES:
+    missing = [name for name in DAILY_DATA_FILES if not (APP_DIR / name).exists()]
+    if missing:
+        # the daily WTI prices aren't committed, draw the monthly ones until fetched
+        logging.getLogger(__name__).warning(
+            "DAILY_PRICES is set but %s is missing, showing monthly prices instead; "
+            "run `python manage.py run fetch-wti-daily` with DAILY_PRICES=1",
+            " and ".join(missing),
+        )
+        DAILY_PRICES = False
+DAILY_MAX_POINTS = int(os.environ.get("DAILY_MAX_POINTS", 500))
+# "lttb" keeps the shape of the line, "minmax" keeps every spike
+DOWNSAMPLE_METHOD = os.environ.get("DOWNSAMPLE_METHOD", "lttb")
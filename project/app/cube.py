@@ -0,0 +1,85 @@
+"""
+Dense date x location x source cube of the URA market snapshots.
+
+The energy sources charts only ever need kWh summed by some combination
+of date, location and source so the snapshots are aggregated once into a
+NumPy array and the chart builders read slices of it.
+"""
+from dataclasses import dataclass
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import SOURCE_LABELS
+
+
+NATIONAL = "Vanuatu"
+NON_RENEWABLE_SOURCES = ("diesel",)
+
+
+@dataclass(frozen=True)
+class EnergySourceCube:
+    dates: Tuple[str, ...]
+    locations: Tuple[str, ...]
+    sources: Tuple[str, ...]
+    # kWh produced with shape (dates, locations, sources)
+    kwh: np.ndarray
+
+    def date_index(self, date: str) -> int:
+        return self.dates.index(date)
+
+    def location_index(self, location: str) -> int:
+        return self.locations.index(location)
+
+    def series(self, location: str = NATIONAL) -> np.ndarray:
+        """kWh produced by each source over time with shape (dates, sources)."""
+        return self.kwh[:, self.location_index(location), :]
+
+    def snapshot(self, location: str, date: str) -> np.ndarray:
+        """kWh produced by each source for a single date."""
+        return self.kwh[self.date_index(date), self.location_index(location), :]
+
+    @property
+    def renewable_mask(self) -> np.ndarray:
+        return np.array([s not in NON_RENEWABLE_SOURCES for s in self.sources])
+
+    def renewable_percent(self, location: str = NATIONAL) -> np.ndarray:
+        """Share of production from renewable sources for each date."""
+        series = self.series(location)
+        renewable = series[:, self.renewable_mask].sum(axis=1)
+        total = series.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return renewable / total
+
+
+def build_cube(
+    df: pd.DataFrame, sources: Sequence[str] = SOURCE_LABELS
+) -> EnergySourceCube:
+    df = df.loc[df["source"].isin(sources)]
+    dates, date_codes = _factorize(df["date"])
+    locations, location_codes = _factorize(df["location"])
+    source_codes = pd.Index(sources).get_indexer(df["source"])
+
+    # the first location is the national total of every other location
+    kwh = np.zeros((len(dates), len(locations) + 1, len(sources)))
+    np.add.at(
+        kwh,
+        (date_codes, location_codes + 1, source_codes),
+        df["kwh"].fillna(0).to_numpy(dtype=float),
+    )
+    kwh[:, 0, :] = kwh[:, 1:, :].sum(axis=1)
+    kwh.flags.writeable = False
+
+    return EnergySourceCube(
+        dates=tuple(dates),
+        locations=(NATIONAL,) + tuple(locations),
+        sources=tuple(sources),
+        kwh=kwh,
+    )
+
+
+def _factorize(values: pd.Series) -> Tuple[list, np.ndarray]:
+    # only the observed categories, periods as "YYYY-MM" like the dropdowns
+    codes, uniques = pd.factorize(values, sort=True)
+    return [str(value) for value in uniques], codes
@@ -0,0 +1,153 @@
+"""
+Conversion of foreign currency prices to Vatu.
+
+The exchange rates are USD per Vatu from exchangerates.org.uk, as
+monthly averages in `app/exchange-rates.csv` and daily spot rates in
+`app/exchange-rates-daily.csv`. A `RateTable` keys either series by
+period and `convert` joins a frame of prices against it with a single
+as-of merge, dividing every price column at once:
+
+    convert(wti, ["price"], rate_table("USD", "M"), missing="previous")
+
+Each price takes the rate of its own period, monthly prices joined
+against daily rates take the last rate of their month. When a period has
+no rate `missing` decides what happens:
+
+* "previous" uses the latest earlier rate at most `tolerance` periods
+  old and leaves the price NaN beyond that;
+* "nan" leaves the price NaN;
+* "drop" drops the row;
+* "raise" raises a `MissingRateError` naming the periods.
+
+New series only need an entry in RATE_DATASETS.
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.data import Snapshot, current_snapshot
+
+# (currency, frequency) -> dataset of rates in that currency per Vatu
+RATE_DATASETS: Dict[Tuple[str, str], str] = {
+    ("USD", "M"): "exchange_rates",
+    ("USD", "D"): "exchange_rates_daily",
+}
+MISSING_POLICIES = ("previous", "nan", "drop", "raise")
+
+
+class MissingRateError(ValueError):
+    pass
+
+
+def infer_freq(dates: pd.Series) -> str:
+    """The frequency of "YYYY-MM" (monthly) or "YYYY-MM-DD" (daily) dates."""
+    lengths = dates.dropna().str.len().unique()
+    if len(lengths) != 1 or lengths[0] not in (7, 10):
+        raise ValueError(f"Can't tell the frequency of dates like {dates.iloc[0]!r}")
+    return "M" if lengths[0] == 7 else "D"
+
+
+def to_periods(dates: pd.Series, freq: Optional[str] = None) -> pd.PeriodIndex:
+    """Dates as periods of `freq`, by default the frequency the dates are written in."""
+    if isinstance(dates.dtype, pd.PeriodDtype):
+        periods = pd.PeriodIndex(dates)
+        return periods if freq is None else periods.asfreq(freq)
+    freq = freq or infer_freq(dates)
+    return pd.PeriodIndex(pd.to_datetime(dates.to_numpy()), freq=freq)
+
+
+@dataclass(frozen=True)
+class RateTable:
+    currency: str
+    # sorted and unique
+    periods: pd.PeriodIndex
+    # `currency` per Vatu for each period
+    rates: np.ndarray
+
+    @classmethod
+    def from_frame(
+        cls,
+        frame: pd.DataFrame,
+        currency: str,
+        date: str = "date",
+        rate: str = "exchange_rate",
+    ) -> "RateTable":
+        series = pd.Series(
+            frame[rate].to_numpy(dtype=float), index=to_periods(frame[date])
+        ).dropna()
+        series = series[~series.index.duplicated(keep="last")].sort_index()
+        rates = series.to_numpy()
+        rates.flags.writeable = False
+        return cls(currency, series.index, rates)
+
+    @property
+    def freq(self) -> str:
+        return self.periods.freqstr
+
+    def lookup(self, periods: pd.PeriodIndex, tolerance: int = 0) -> np.ndarray:
+        """
+        The rate for each of `periods`, or the latest one at most `tolerance`
+        periods earlier, NaN when there's none.
+        """
+        # compare period ordinals so monthly and daily keys join the same way
+        keys = periods.asfreq(self.freq, how="end").asi8
+        left = pd.DataFrame({"key": keys, "row": np.arange(len(keys))})
+        right = pd.DataFrame({"key": self.periods.asi8, "rate": self.rates})
+        merged = pd.merge_asof(
+            left.sort_values("key", kind="stable"),
+            right,
+            on="key",
+            direction="backward",
+            tolerance=tolerance,
+        )
+        rates = np.empty(len(keys))
+        rates[merged["row"].to_numpy()] = merged["rate"].to_numpy()
+        # NaT keys sort first and could only match nothing
+        rates[periods.isna()] = np.nan
+        return rates
+
+
+def rate_table(
+    currency: str = "USD", freq: str = "M", snapshot: Optional[Snapshot] = None
+) -> RateTable:
+    """The rates of `currency` at `freq` built once per snapshot."""
+    snapshot = snapshot or current_snapshot()
+    name = RATE_DATASETS[(currency, freq)]
+    return snapshot.derived(
+        f"rate_table:{name}",
+        lambda s: RateTable.from_frame(s.frame(name), currency),
+    )
+
+
+def convert(
+    frame: pd.DataFrame,
+    columns: Sequence[str],
+    rates: RateTable,
+    date: str = "date",
+    missing: str = "previous",
+    tolerance: int = 1,
+    rate_column: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    A copy of `frame` with the prices in `columns` converted to Vatu by the
+    rate of each row's `date`. `rate_column` adds the rate used.
+    """
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"missing must be one of {MISSING_POLICIES}, not {missing!r}")
+    periods = to_periods(frame[date])
+    found = rates.lookup(periods, tolerance if missing == "previous" else 0)
+    absent = np.isnan(found)
+    if missing == "raise" and absent.any():
+        months = ", ".join(str(p) for p in periods[absent].unique())
+        raise MissingRateError(f"No {rates.currency} rate for {months}")
+
+    columns = list(columns)
+    values = frame[columns].to_numpy(dtype=float) / found[:, np.newaxis]
+    converted = frame.assign(**dict(zip(columns, values.T)))
+    if rate_column is not None:
+        converted[rate_column] = found
+    if missing == "drop":
+        converted = converted.loc[~absent]
+    return converted
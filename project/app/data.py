@@ -0,0 +1,457 @@
+"""
+Datasets used by the app.
+
+Each CSV is loaded once per process and shared by the pages and utils
+through the accessors at the bottom of this module. The frames returned
+are shared between every caller, and every callback thread, so their
+arrays are made read-only and writing to them raises a ValueError; use
+`.copy()` or `.assign()` when a page needs derived columns, or build them
+once per snapshot with `Snapshot.derived`.
+
+The loaded datasets are held in a versioned `Snapshot`. When
+DATA_RELOAD_INTERVAL is set a background thread watches the CSVs and
+swaps in a new snapshot when their contents change. Callbacks wrapped
+with `with_snapshot` (and every cached figure builder) keep using the
+snapshot they started with until they finish.
+
+Each dataset is checked and typed by `app.schema` as it is loaded (or
+compiled), the URA snapshots with categorical locations and sources and
+monthly periods.
+
+When `python -m app.compiled` has been run the datasets are memory-mapped
+from the compiled file instead of parsed from the CSVs. With
+APP_DATA_BACKEND=sqlite they stay in the database built by
+`python -m app.database` and each frame is only read when it's first
+asked for (see `app.database`).
+
+Run `python -m app.data` to print how long each dataset took to load and
+how much memory it uses.
+"""
+import contextvars
+import dataclasses
+import functools
+import hashlib
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from app import database
+from app.compiled import Artifact, open_artifact
+from app.config import (
+    APP_DATA_BACKEND,
+    APP_DATA_SOURCE,
+    APP_DIR,
+    COMPILED_DATA_FILE,
+    DAILY_PRICES,
+    DATA_RELOAD_INTERVAL,
+    SQLITE_DATA_FILE,
+)
+from app.cube import EnergySourceCube, build_cube
+from app.schema import apply_schema
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class Dataset:
+    name: str
+    path: Path
+    # None when the dataset is read from `store` on demand
+    frame: Optional[pd.DataFrame]
+    load_seconds: float
+    memory_bytes: int
+    # content hash of the source file so caches can tell datasets apart
+    version: str
+    # "csv", "compiled" or "sqlite"
+    source: str
+    # SQLite database the frame is read from when it isn't loaded
+    store: Optional[Path] = None
+
+
+# -------
+# Loaders
+# -------
+
+
+def load_unelco(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path)
+
+
+def load_ura(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path, thousands=",")
+
+
+def load_wti(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path)
+
+
+def load_exchange_rates(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path)
+
+
+LOADERS: Dict[str, Tuple[str, Callable[[Path], pd.DataFrame]]] = {
+    "unelco": ("electricity.csv", load_unelco),
+    "ura": ("ura-market-snapshots.csv", load_ura),
+    "wti": ("crude-oil-wti.csv", load_wti),
+    "exchange_rates": ("exchange-rates.csv", load_exchange_rates),
+}
+# only loaded for the daily energy prices, app.config turns DAILY_PRICES off
+# when these files haven't been fetched
+DAILY_LOADERS: Dict[str, Tuple[str, Callable[[Path], pd.DataFrame]]] = {
+    "wti_daily": ("crude-oil-wti-daily.csv", load_wti),
+    "exchange_rates_daily": ("exchange-rates-daily.csv", load_exchange_rates),
+}
+if DAILY_PRICES:
+    LOADERS.update(DAILY_LOADERS)
+
+
+# --------
+# Registry
+# --------
+
+
+def freeze(frame: pd.DataFrame) -> pd.DataFrame:
+    """Make the arrays behind `frame` read-only."""
+    # the blocks hold the arrays every column is a view of
+    for block in frame._mgr.blocks:
+        values = block.values
+        # categoricals and periods keep their codes and ordinals in _ndarray,
+        # nullable integers their values and mask in _data and _mask
+        arrays = [values] + [
+            getattr(values, name, None) for name in ("_ndarray", "_data", "_mask")
+        ]
+        for array in arrays:
+            if isinstance(array, np.ndarray):
+                array.flags.writeable = False
+    return frame
+
+
+class Snapshot:
+    """An immutable set of loaded datasets plus values derived from them."""
+
+    def __init__(self, datasets: Dict[str, Dataset]):
+        for dataset in datasets.values():
+            if dataset.frame is not None:
+                freeze(dataset.frame)
+        self.datasets = MappingProxyType(dict(datasets))
+        self.version = "-".join(dataset.version for dataset in datasets.values())
+        self._derived: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def frame(self, name: str) -> pd.DataFrame:
+        dataset = self.datasets[name]
+        if dataset.frame is not None:
+            return dataset.frame
+        return self.derived(
+            f"frame:{name}", lambda s: database.read_frame(dataset.store, name)
+        )
+
+    def dataset_version(self, *names: str) -> str:
+        return "-".join(self.datasets[name].version for name in names)
+
+    def derived(self, name: str, build: Callable[["Snapshot"], Any]) -> Any:
+        """
+        Build a value from this snapshot's data once and keep it with the
+        snapshot. Derived frames are shared like the datasets so they are
+        made read-only too.
+        """
+        with self._lock:
+            if name not in self._derived:
+                value = build(self)
+                if isinstance(value, pd.DataFrame):
+                    freeze(value)
+                self._derived[name] = value
+            return self._derived[name]
+
+
+_snapshot: Optional[Snapshot] = None
+_pinned: contextvars.ContextVar = contextvars.ContextVar("snapshot", default=None)
+_lock = threading.RLock()
+_artifact: Optional[Tuple[int, Artifact]] = None
+_reload_listeners: List[Callable[[Snapshot, Snapshot], None]] = []
+# modification time and size of each file when it was last hashed
+_stats: Dict[str, Tuple[int, int]] = {}
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+
+
+def file_stat(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _compiled_frame(name: str, version: str) -> Optional[pd.DataFrame]:
+    global _artifact
+    if APP_DATA_SOURCE == "csv":
+        return None
+    path = Path(COMPILED_DATA_FILE)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    # reopen the compiled file if it has been rebuilt since it was opened
+    if _artifact is None or _artifact[0] != mtime:
+        artifact = open_artifact(path)
+        if artifact is None:
+            return None
+        _artifact = (mtime, artifact)
+    frame = _artifact[1].frame(name, version)
+    if frame is None:
+        logger.warning("Compiled %s is out of date, loading the CSV instead", name)
+    return frame
+
+
+def _load(name: str) -> Dataset:
+    filename, loader = LOADERS[name]
+    path = APP_DIR / filename
+    start = time.perf_counter()
+    # stat before hashing so a write in between is picked up by the next reload
+    _stats[name] = file_stat(path)
+    version = file_hash(path)
+    if APP_DATA_BACKEND == "sqlite":
+        store = Path(SQLITE_DATA_FILE)
+        if database.dataset_rows(store, name, version) is not None:
+            logger.info("Reading %s from %s on demand", name, store)
+            return Dataset(
+                name=name,
+                path=path,
+                frame=None,
+                load_seconds=time.perf_counter() - start,
+                memory_bytes=0,
+                version=version,
+                source="sqlite",
+                store=store,
+            )
+        logger.warning("%s is out of date in %s, loading the CSV instead", name, store)
+    source = "compiled"
+    frame = _compiled_frame(name, version)
+    if frame is None:
+        source = "csv"
+        frame = apply_schema(name, loader(path))
+    # the compiled file holds the schema's output already, converting it again
+    # would copy the mapped columns into each worker
+    load_seconds = time.perf_counter() - start
+    memory_bytes = int(frame.memory_usage(deep=True).sum())
+    logger.info(
+        "Loaded %s from %s in %.1f ms (%.1f KiB)",
+        name,
+        filename if source == "csv" else COMPILED_DATA_FILE,
+        load_seconds * 1000,
+        memory_bytes / 1024,
+    )
+    return Dataset(
+        name=name,
+        path=path,
+        frame=frame,
+        load_seconds=load_seconds,
+        memory_bytes=memory_bytes,
+        version=version,
+        source=source,
+    )
+
+
+def current_snapshot() -> Snapshot:
+    global _snapshot
+    pinned = _pinned.get()
+    if pinned is not None:
+        return pinned
+    if _snapshot is None:
+        with _lock:
+            if _snapshot is None:
+                _snapshot = Snapshot({name: _load(name) for name in LOADERS})
+    _ensure_watcher()
+    return _snapshot
+
+
+@contextmanager
+def pinned_snapshot():
+    """Use the same snapshot for every dataset access inside the block."""
+    if _pinned.get() is not None:
+        yield _pinned.get()
+        return
+    snapshot = current_snapshot()
+    token = _pinned.set(snapshot)
+    try:
+        yield snapshot
+    finally:
+        _pinned.reset(token)
+
+
+def with_snapshot(func):
+    """Run a callback against a single snapshot even if the data is reloaded meanwhile."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with pinned_snapshot():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def reload() -> bool:
+    """
+    Load any dataset whose file contents changed and swap in a new snapshot.
+    Returns whether the data changed.
+    """
+    global _snapshot
+    with _lock:
+        if _snapshot is None:
+            current_snapshot()
+        old = _snapshot
+        datasets = dict(old.datasets)
+        for name, dataset in old.datasets.items():
+            stat = file_stat(dataset.path)
+            if stat == _stats.get(name):
+                continue
+            # touched files are only reloaded when their contents changed
+            _stats[name] = stat
+            if file_hash(dataset.path) != dataset.version:
+                datasets[name] = _load(name)
+        if all(datasets[name] is old.datasets[name] for name in datasets):
+            return False
+        new = _snapshot = Snapshot(datasets)
+    logger.info("Reloaded data, now at version %s", new.version)
+    for listener in _reload_listeners:
+        listener(old, new)
+    return True
+
+
+def install_snapshot(snapshot: Snapshot) -> Snapshot:
+    """
+    Swap in a snapshot built elsewhere, e.g. the synthetic data used by the
+    benchmarks, and return the one it replaced.
+    """
+    global _snapshot
+    with _lock:
+        if _snapshot is None:
+            current_snapshot()
+        old, _snapshot = _snapshot, snapshot
+    for listener in _reload_listeners:
+        listener(old, snapshot)
+    return old
+
+
+def add_reload_listener(listener: Callable[[Snapshot, Snapshot], None]):
+    """Call `listener(old, new)` whenever a new snapshot is swapped in."""
+    _reload_listeners.append(listener)
+
+
+_watcher_pid: Optional[int] = None
+
+
+def _ensure_watcher():
+    # started lazily so each gunicorn worker forked from a preloaded app runs its own
+    global _watcher_pid
+    if not DATA_RELOAD_INTERVAL or _watcher_pid == os.getpid():
+        return
+    with _lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+        thread = threading.Thread(target=_watch, name="data-watcher", daemon=True)
+        thread.start()
+
+
+def _watch():
+    while True:
+        time.sleep(DATA_RELOAD_INTERVAL)
+        try:
+            reload()
+        except Exception:
+            # a half written CSV will fail to parse, try again next time
+            logger.exception("Failed to reload data")
+
+
+def get_dataset(name: str) -> Dataset:
+    if name not in LOADERS:
+        raise KeyError(f"Unknown dataset {name!r}")
+    return current_snapshot().datasets[name]
+
+
+def dataset_version(*names: str) -> str:
+    return current_snapshot().dataset_version(*names)
+
+
+def load_all() -> List[Dataset]:
+    return list(current_snapshot().datasets.values())
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # not linux, fall back to peak RSS which macOS reports in bytes
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def load_report() -> str:
+    lines = [
+        f"{'dataset':<16}{'source':>10}{'rows':>8}{'load (ms)':>12}{'memory (KiB)':>14}"
+    ]
+    for dataset in load_all():
+        if dataset.frame is not None:
+            rows = len(dataset.frame)
+        else:
+            rows = database.dataset_rows(dataset.store, dataset.name, dataset.version)
+        lines.append(
+            f"{dataset.name:<16}"
+            f"{dataset.source:>10}"
+            f"{rows:>8}"
+            f"{dataset.load_seconds * 1000:>12.1f}"
+            f"{dataset.memory_bytes / 1024:>14.1f}"
+        )
+    lines.append(f"process RSS {rss_bytes() / 1024 ** 2:.1f} MiB")
+    return "\n".join(lines)
+
+
+# ---------
+# Accessors
+# ---------
+
+
+def get_unelco_data() -> pd.DataFrame:
+    return current_snapshot().frame("unelco")
+
+
+def get_ura_data() -> pd.DataFrame:
+    return current_snapshot().frame("ura")
+
+
+def get_wti_data() -> pd.DataFrame:
+    return current_snapshot().frame("wti")
+
+
+def get_exchange_rate_data() -> pd.DataFrame:
+    return current_snapshot().frame("exchange_rates")
+
+
+def _build_ura_cube(
+    snapshot: Snapshot,
+) -> Union[EnergySourceCube, database.StoredEnergySources]:
+    dataset = snapshot.datasets["ura"]
+    if dataset.frame is None:
+        # summed by the database a slice at a time so the rows are never loaded
+        return database.StoredEnergySources(dataset.store)
+    return build_cube(dataset.frame)
+
+
+def get_ura_cube() -> Union[EnergySourceCube, database.StoredEnergySources]:
+    return current_snapshot().derived("ura_cube", _build_ura_cube)
+
+
+if __name__ == "__main__":
+    print(load_report())
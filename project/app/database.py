@@ -0,0 +1,267 @@
+"""
+SQLite copy of the app datasets.
+
+    python -m app.database            # build the database from the CSVs
+
+With APP_DATA_BACKEND=sqlite the datasets are left in the database rather
+than loaded into every worker: a frame is only read, once per snapshot,
+when a page asks for it. The URA rows are never read at all, in place of
+the energy source cube the charts get a `StoredEnergySources` which sums
+just the slice each chart needs with an aggregate query. The URA table
+stores locations and sources as ids into the `locations` and `sources`
+tables and is indexed on (location, date, source) and (date), the price
+tables on date. The national totals are summed into `ura_national` when
+the database is built.
+
+Connections are read-only and pooled per process so gunicorn workers
+forked from a preloaded app each open their own; a connection is used by
+one thread at a time. Like the compiled file each table records the hash
+of the CSV it was built from and `app.data` falls back to the CSV when
+the database is missing or out of date.
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import SOURCE_LABELS
+from app.cube import NATIONAL, EnergySourceCube
+from app.schema import apply_schema
+
+INDEXES = {
+    "ura": [("location", "date", "source"), ("date",)],
+    "unelco": [("date",)],
+    "wti": [("date",)],
+    "exchange_rates": [("date",)],
+    "wti_daily": [("date",)],
+    "exchange_rates_daily": [("date",)],
+}
+
+READ_QUERIES = {
+    "ura": "SELECT date, locations.name AS location, sources.name AS source, kwh "
+    "FROM ura JOIN locations ON locations.id = ura.location "
+    "JOIN sources ON sources.id = ura.source ORDER BY ura.rowid",
+}
+
+# (pid, path, inode, mtime) -> idle connections
+_pools: Dict[Tuple[int, str, int, int], queue.SimpleQueue] = {}
+_lock = threading.Lock()
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    return sqlite3.connect(
+        f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False
+    )
+
+
+def _pool(path: Path) -> queue.SimpleQueue:
+    stat = os.stat(path)
+    # keyed by pid so a forked worker never uses its parent's connections,
+    # and by file so a rebuilt database isn't read through the old one's
+    key = (os.getpid(), str(path), stat.st_ino, stat.st_mtime_ns)
+    with _lock:
+        if key not in _pools:
+            for stale in [k for k in _pools if k[:2] == key[:2]]:
+                _close(_pools.pop(stale))
+            _pools[key] = queue.SimpleQueue()
+        return _pools[key]
+
+
+def _close(pool: queue.SimpleQueue):
+    while not pool.empty():
+        pool.get_nowait().close()
+
+
+@contextmanager
+def connection(path: Path) -> Iterator[sqlite3.Connection]:
+    """A read-only connection to `path` from this process's pool."""
+    pool = _pool(path)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _connect(path)
+    try:
+        yield conn
+    finally:
+        pool.put(conn)
+
+
+def _store_ura(conn: sqlite3.Connection, frame: pd.DataFrame):
+    # locations and sources are stored once and referenced by id
+    for column in ("location", "source"):
+        categories = frame[column].cat.categories
+        conn.execute(f"CREATE TABLE {column}s (id INTEGER PRIMARY KEY, name TEXT)")
+        conn.executemany(f"INSERT INTO {column}s VALUES (?, ?)", enumerate(categories))
+    pd.DataFrame(
+        {
+            "date": frame["date"].astype(str),
+            "location": frame["location"].cat.codes,
+            "source": frame["source"].cat.codes,
+            "kwh": frame["kwh"],
+        }
+    ).to_sql("ura", conn, index=False)
+    # summed once here as a full scan of the rows is too slow for every request
+    conn.execute(
+        "CREATE TABLE ura_national AS "
+        "SELECT date, source, SUM(kwh) AS kwh FROM ura GROUP BY date, source"
+    )
+    conn.execute("CREATE INDEX ura_national_date ON ura_national (date)")
+
+
+def write_database(path: Path, datasets: Dict[str, Tuple[pd.DataFrame, str]]):
+    """Write `{name: (frame, source version)}` to `path` atomically."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp)
+        with conn:
+            conn.execute(
+                "CREATE TABLE datasets (name TEXT PRIMARY KEY, version TEXT, rows INTEGER)"
+            )
+            for name, (frame, version) in datasets.items():
+                frame = apply_schema(name, frame)
+                if name == "ura":
+                    _store_ura(conn, frame)
+                else:
+                    frame.to_sql(name, conn, index=False)
+                for columns in INDEXES.get(name, []):
+                    conn.execute(
+                        f"CREATE INDEX {name}_{'_'.join(columns)} "
+                        f"ON {name} ({', '.join(columns)})"
+                    )
+                conn.execute(
+                    "INSERT INTO datasets VALUES (?, ?, ?)", (name, version, len(frame))
+                )
+            conn.execute("ANALYZE")
+        conn.close()
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def dataset_rows(path: Path, name: str, version: str) -> Optional[int]:
+    """Rows of the stored dataset or None when it was built from other data."""
+    try:
+        with connection(path) as conn:
+            row = conn.execute(
+                "SELECT version, rows FROM datasets WHERE name = ?", (name,)
+            ).fetchone()
+    except (OSError, sqlite3.Error):
+        return None
+    if row is None or row[0] != version:
+        return None
+    return row[1]
+
+
+def read_frame(path: Path, name: str) -> pd.DataFrame:
+    query = READ_QUERIES.get(name, f"SELECT * FROM {name} ORDER BY rowid")
+    with connection(path) as conn:
+        frame = pd.read_sql_query(query, conn)
+    return apply_schema(name, frame)
+
+
+class StoredEnergySources:
+    """
+    The `EnergySourceCube` interface answered by aggregate queries, each
+    slice a chart asks for is summed by SQLite using the indexes.
+    """
+
+    renewable_mask = EnergySourceCube.renewable_mask
+    renewable_percent = EnergySourceCube.renewable_percent
+
+    def __init__(self, path: Path, sources: Sequence[str] = SOURCE_LABELS):
+        self.path = path
+        self.sources = tuple(sources)
+        with connection(path) as conn:
+            self.dates = tuple(
+                row[0]
+                for row in conn.execute("SELECT DISTINCT date FROM ura ORDER BY date")
+            )
+            self._location_ids = dict(
+                conn.execute(
+                    "SELECT name, id FROM locations "
+                    "WHERE id IN (SELECT DISTINCT location FROM ura) ORDER BY name"
+                ).fetchall()
+            )
+            source_ids = dict(conn.execute("SELECT name, id FROM sources").fetchall())
+        self.locations = (NATIONAL,) + tuple(self._location_ids)
+        # column of each source id in the arrays returned
+        self._columns = {source_ids[source]: i for i, source in enumerate(self.sources)}
+
+    def _filter(
+        self, location: str, date: Optional[str] = None
+    ) -> Tuple[str, str, list]:
+        """The table to query and the WHERE clause and parameters picking the slice."""
+        table = "ura_national"
+        clauses = [f"source IN ({', '.join('?' * len(self._columns))})"]
+        params = list(self._columns)
+        if location != NATIONAL:
+            table = "ura"
+            clauses.append("location = ?")
+            params.append(self._location_ids[location])
+        if date is not None:
+            clauses.append("date = ?")
+            params.append(date)
+        return table, " AND ".join(clauses), params
+
+    def series(self, location: str = NATIONAL) -> np.ndarray:
+        """kWh produced by each source over time with shape (dates, sources)."""
+        table, where, params = self._filter(location)
+        rows = self._query(
+            f"SELECT date, source, SUM(kwh) FROM {table} WHERE {where} "
+            "GROUP BY date, source",
+            params,
+        )
+        series = np.zeros((len(self.dates), len(self.sources)))
+        date_index = {date: i for i, date in enumerate(self.dates)}
+        for date, source, kwh in rows:
+            series[date_index[date], self._columns[source]] = kwh or 0
+        return series
+
+    def snapshot(self, location: str, date: str) -> np.ndarray:
+        """kWh produced by each source for a single date."""
+        table, where, params = self._filter(location, date)
+        values = np.zeros(len(self.sources))
+        for source, kwh in self._query(
+            f"SELECT source, SUM(kwh) FROM {table} WHERE {where} GROUP BY source",
+            params,
+        ):
+            values[self._columns[source]] = kwh or 0
+        return values
+
+    def _query(self, sql: str, params: list) -> list:
+        with connection(self.path) as conn:
+            return conn.execute(sql, params).fetchall()
+
+
+def build_database(path: Path):
+    from app.data import APP_DIR, LOADERS, file_hash
+
+    datasets = {}
+    for name, (filename, loader) in LOADERS.items():
+        source = APP_DIR / filename
+        datasets[name] = (loader(source), file_hash(source))
+    write_database(path, datasets)
+
+
+def main():
+    from app.config import SQLITE_DATA_FILE
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", type=Path, default=Path(SQLITE_DATA_FILE))
+    args = parser.parse_args()
+    build_database(args.output)
+    print(f"Wrote datasets to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Downsampling of long series for charts.
+
+A chart is only a few hundred pixels wide so a daily series is cut down to
+about that many points before it is sent to the browser. Both methods
+return the indices of the points to keep, in order:
+
+* `lttb` (Largest-Triangle-Three-Buckets) keeps the points which best
+  preserve the shape of the line;
+* `minmax` keeps the lowest and highest point of each bucket so no spike
+  is ever smoothed away.
+
+`window` picks the points inside a zoomed range so only the visible part
+of a series is downsampled.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = x.astype(float)
+    y = y.astype(float)
+    # the first and last points are always kept, the rest are split into buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=np.intp)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        following = slice(end, edges[bucket + 2] if bucket + 2 < len(edges) else n)
+        mean_x, mean_y = x[following].mean(), y[following].mean()
+        # twice the area of the triangle each point makes with the point
+        # selected from the previous bucket and the mean of the next one
+        area = np.abs(
+            (x[selected] - mean_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (mean_y - y[selected])
+        )
+        selected = start + int(np.argmax(area))
+        indices[bucket + 1] = selected
+    return indices
+
+
+def minmax(y: np.ndarray, threshold: int) -> np.ndarray:
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    edges = np.linspace(0, n, threshold // 2 + 1).astype(int)
+    indices = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        low = start + int(np.argmin(y[start:end]))
+        high = start + int(np.argmax(y[start:end]))
+        indices.extend(sorted({low, high}))
+    return np.array(indices, dtype=np.intp)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, threshold: int, method: str = "lttb"):
+    """Indices of at most `threshold` points of (x, y) picked by `method`."""
+    if method == "lttb":
+        return lttb(x, y, threshold)
+    if method == "minmax":
+        return minmax(y, threshold)
+    raise ValueError(f"Unknown downsampling method {method!r}")
+
+
+def window(
+    x: np.ndarray, start: Optional[float], end: Optional[float]
+) -> Tuple[int, int]:
+    """
+    The slice of the sorted `x` between `start` and `end`, plus a point
+    either side so the line runs to the edges of the chart.
+    """
+    low = 0 if start is None else max(int(np.searchsorted(x, start)) - 1, 0)
+    high = (
+        len(x)
+        if end is None
+        else min(int(np.searchsorted(x, end, "right")) + 1, len(x))
+    )
+    return low, high
@@ -0,0 +1,201 @@
+"""
+Timings of the Dash callbacks.
+
+Set METRICS=1 to record, for every callback request, the wall time, the
+time `cached_figure` spends building figures and serializing them to
+JSON and the size of the response; Dash encoding the response only
+counts towards the wall time. The totals are served as Prometheus text
+on `/metrics` and each callback response carries a `Server-Timing`
+header so the browser's network panel shows the same breakdown. Every
+gunicorn worker keeps its own totals so each scrape sees the worker that
+answered it.
+
+When METRICS is unset nothing is installed and `timed` returns a shared
+no-op context manager so the figure builders pay for one function call.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Tuple
+
+import flask
+
+from app.config import METRICS
+
+CALLBACK_PATH = "/_dash-update-component"
+PHASES = ("build", "serialize")
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7)
+
+_noop = nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def lines(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class CallbackMetrics:
+    def __init__(self):
+        self.wall: Dict[str, Histogram] = defaultdict(
+            lambda: Histogram(SECONDS_BUCKETS)
+        )
+        self.payload: Dict[str, Histogram] = defaultdict(
+            lambda: Histogram(BYTES_BUCKETS)
+        )
+        # (callback, phase) -> [seconds, count]
+        self.phases: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0.0, 0])
+        self.errors: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(
+        self, callback: str, wall: float, phases: Dict[str, float], size: int, ok: bool
+    ):
+        with self._lock:
+            self.wall[callback].observe(wall)
+            self.payload[callback].observe(size)
+            for phase in PHASES:
+                total = self.phases[(callback, phase)]
+                total[0] += phases.get(phase, 0.0)
+                total[1] += 1
+            if not ok:
+                self.errors[callback] += 1
+
+    def prometheus(self) -> str:
+        from app.cache import figure_cache
+
+        pid = os.getpid()
+        lines = [
+            "# HELP dash_callback_seconds Wall time of each callback request.",
+            "# TYPE dash_callback_seconds histogram",
+        ]
+        with self._lock:
+            for callback, histogram in sorted(self.wall.items()):
+                lines += histogram.lines(
+                    "dash_callback_seconds", f'callback="{callback}",pid="{pid}"'
+                )
+            lines += [
+                "# HELP dash_callback_phase_seconds Time spent building figures and serializing JSON.",
+                "# TYPE dash_callback_phase_seconds summary",
+            ]
+            for (callback, phase), (seconds, count) in sorted(self.phases.items()):
+                labels = f'callback="{callback}",phase="{phase}",pid="{pid}"'
+                lines.append(f"dash_callback_phase_seconds_sum{{{labels}}} {seconds}")
+                lines.append(f"dash_callback_phase_seconds_count{{{labels}}} {count}")
+            lines += [
+                "# HELP dash_callback_response_bytes Size of each callback response.",
+                "# TYPE dash_callback_response_bytes histogram",
+            ]
+            for callback, histogram in sorted(self.payload.items()):
+                lines += histogram.lines(
+                    "dash_callback_response_bytes", f'callback="{callback}",pid="{pid}"'
+                )
+            lines += [
+                "# HELP dash_callback_errors_total Callback requests which failed.",
+                "# TYPE dash_callback_errors_total counter",
+            ]
+            for callback, count in sorted(self.errors.items()):
+                lines.append(
+                    f'dash_callback_errors_total{{callback="{callback}",pid="{pid}"}} {count}'
+                )
+        lines += [
+            "# HELP dash_figure_cache_events_total Figure cache lookups by outcome.",
+            "# TYPE dash_figure_cache_events_total counter",
+        ]
+        for event, count in figure_cache.stats().items():
+            if event != "size":
+                lines.append(
+                    f'dash_figure_cache_events_total{{event="{event}",pid="{pid}"}} {count}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+callback_metrics = CallbackMetrics()
+
+
+def timed(phase: str):
+    """Add the time spent in the block to `phase` of the current callback request."""
+    if not METRICS or not flask.has_request_context():
+        return _noop
+    return _timed(phase)
+
+
+@contextmanager
+def _timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases = flask.g.setdefault("metrics_phases", defaultdict(float))
+        phases[phase] += time.perf_counter() - start
+
+
+def callback_name(app) -> str:
+    body = flask.request.get_json(silent=True) or {}
+    output = body.get("output", "")
+    callback = app.callback_map.get(output, {}).get("callback")
+    return getattr(callback, "__name__", output or "unknown")
+
+
+def install(app):
+    """Add the timing hooks and the `/metrics` route to the Dash app's server."""
+    if not METRICS:
+        return
+    server = app.server
+
+    def start_timer():
+        if flask.request.path.endswith(CALLBACK_PATH):
+            flask.g.metrics_start = time.perf_counter()
+
+    # run before Dash's own hooks, the first request sets up the pages and builds figures
+    server.before_request_funcs.setdefault(None, []).insert(0, start_timer)
+
+    @server.after_request
+    def record_timings(response):
+        start = flask.g.get("metrics_start")
+        if start is None:
+            return response
+        wall = time.perf_counter() - start
+        phases = flask.g.get("metrics_phases", {})
+        callback_metrics.record(
+            callback_name(app),
+            wall,
+            phases,
+            response.calculate_content_length() or 0,
+            response.status_code in (200, 204),
+        )
+        timings = [f"wall;dur={wall * 1000:.1f}"]
+        timings += [
+            f"{phase};dur={phases.get(phase, 0.0) * 1000:.1f}" for phase in PHASES
+        ]
+        response.headers["Server-Timing"] = ", ".join(timings)
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        return flask.Response(
+            callback_metrics.prometheus(), mimetype="text/plain; version=0.0.4"
+        )
@@ -1,12 +1,18 @@
-from dash import html, dcc, Input, Output, State, register_page, callback
+from typing import Optional, Tuple
+
+from dash import html, dcc, Input, Output, State, Patch, register_page, callback
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import plotly.express as px
+import numpy as np
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import pandas as pd
 
-from app.config import SOURCE_COLORS
-# from app.utils import get_unelco_data, get_wti_data  # TODO begin using these utils
+from app.cache import cached_figure
+from app.config import DAILY_MAX_POINTS, DAILY_PRICES, DOWNSAMPLE_METHOD, SOURCE_COLORS
+from app.currency import convert, rate_table, to_periods
+from app.data import current_snapshot, get_unelco_data, with_snapshot
+from app.downsample import downsample, window
+from app.payload import compact_array
 
 register_page(__name__, top_nav=True)
 
@@ -14,45 +20,113 @@ register_page(__name__, top_nav=True)
 # Setup
 # -----
 
-unelco_rates = pd.read_csv("app/electricity.csv")
-oil_prices = pd.read_csv("app/crude-oil-wti.csv")
-# Update date value to remove day from date
-oil_prices["date"] = oil_prices["date"].str.replace("-15", "")
-exchange_rates = pd.read_csv("app/exchange-rates.csv")
-# Update USD/barrel price to Vatu/barrel price by exchante rate of same month
-oil_prices = pd.concat(
-    [
-        oil_prices.set_index("date"),
-        exchange_rates.set_index("date"),
-    ],
-    axis=1,
-    join="inner",
-).reset_index()
-oil_prices.loc[:, ["price"]] = oil_prices.loc[:, ["price"]].divide(
-    oil_prices.loc[:, "exchange_rate"],
-    axis="index",
+def get_oil_prices() -> pd.DataFrame:
+    return current_snapshot().derived("oil_prices", convert_oil_prices)
+
+
+def convert_oil_prices(snapshot) -> pd.DataFrame:
+    wti = snapshot.frame("wti")
+    # USD/barrel to Vatu/barrel by the rate of the same month, a month without
+    # a rate yet borrows the month before's and is left blank beyond that
+    oil_prices = convert(
+        wti, ["price"], rate_table("USD", "M", snapshot), missing="previous"
+    )
+    # the monthly averages are dated on the 15th, plot them by month like the tariffs
+    return oil_prices.assign(date=to_periods(wti["date"], "M").strftime("%Y-%m"))
+
+
+def get_daily_oil_prices() -> pd.DataFrame:
+    return current_snapshot().derived("daily_oil_prices", convert_daily_oil_prices)
+
+
+def convert_daily_oil_prices(snapshot) -> pd.DataFrame:
+    wti = snapshot.frame("wti_daily")
+    # a rate a few days old covers a long weekend, days without one are dropped
+    oil_prices = convert(
+        wti,
+        ["price"],
+        rate_table("USD", "D", snapshot),
+        missing="previous",
+        tolerance=4,
+    ).dropna(subset=["price"])
+    # day ordinals to search and downsample by
+    return oil_prices.assign(day=to_periods(oil_prices["date"]).asi8)
+
+
+def daily_oil_window(
+    start: Optional[str] = None, end: Optional[str] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dates and prices of the daily oil prices between `start` and `end`,
+    downsampled to DAILY_MAX_POINTS.
+    """
+    oil_prices = get_daily_oil_prices()
+    days = oil_prices["day"].to_numpy()
+    low, high = window(
+        days,
+        None if start is None else pd.Period(start[:10], "D").ordinal,
+        None if end is None else pd.Period(end[:10], "D").ordinal,
+    )
+    prices = oil_prices["price"].to_numpy()[low:high]
+    keep = downsample(days[low:high], prices, DAILY_MAX_POINTS, DOWNSAMPLE_METHOD)
+    return oil_prices["date"].to_numpy()[low:high][keep], prices[keep]
+
+
+# the daily prices replace the monthly ones in DAILY_PRICES mode
+OIL_DATASETS = (
+    ("wti_daily", "exchange_rates_daily") if DAILY_PRICES else ("wti", "exchange_rates")
 )
-oil_prices["price"] = oil_prices["price"].astype("int")
 
-tariffs = set(unelco_rates.columns)
-tariffs.remove("date")
-TARIFFS = sorted(list(tariffs))
 
+def get_tariffs():
+    tariffs = set(get_unelco_data().columns)
+    tariffs.remove("date")
+    return sorted(list(tariffs))
+
+
+def get_tariff_changes() -> pd.DataFrame:
+    return current_snapshot().derived("tariff_changes", diff_tariffs)
+
+
+def diff_tariffs(snapshot) -> pd.DataFrame:
+    # change of every tariff since the month before, the first month has none
+    rates = snapshot.frame("unelco").set_index("date")
+    return rates.diff().reset_index()
 
+
+@cached_figure(
+    "unelco",
+    *OIL_DATASETS,
+    precision={"Crude Oil Price": 0, "Tariff Rate": 2},
+)
 def build_figure_one(tariff: str = "base_rate"):
     # TODO how to compare cost against percent of Port Vila energy not produced by renewable sources
+    from plotly.subplots import make_subplots
+
+    unelco_rates = get_unelco_data()
     figure = make_subplots(specs=[[{"secondary_y": True}]])
     figure.update_yaxes(title_text="Tariff Rate - Vatu/kWh", secondary_y=True)
     figure.update_yaxes(title_text="Crude Oil - Vatu/Barrel", secondary_y=False)
-    figure.add_trace(
-        go.Bar(
+    if DAILY_PRICES:
+        dates, prices = daily_oil_window()
+        oil_trace = go.Scatter(
+            x=dates,
+            y=prices,
+            mode="lines",
+            name="Crude Oil Price",
+            marker_color=SOURCE_COLORS[3],
+        )
+        # keep the zoom when the traces are patched
+        figure.update_layout(uirevision="energy-prices")
+    else:
+        oil_prices = get_oil_prices()
+        oil_trace = go.Bar(
             x=oil_prices["date"],
             y=oil_prices["price"],
             name="Crude Oil Price",
             marker_color=SOURCE_COLORS[3],
-        ),
-        secondary_y=False,
-    )
+        )
+    figure.add_trace(oil_trace, secondary_y=False)
     figure.add_trace(
         go.Line(
             x=unelco_rates["date"],
@@ -68,41 +142,44 @@ def build_figure_one(tariff: str = "base_rate"):
     return figure
 
 
+@cached_figure("unelco", precision=2)
 def build_figure_two(tariff: str = "base_rate"):
-    unelco_rates["base_rate_diff"] = unelco_rates["base_rate"].diff()
-    figure = px.bar(unelco_rates, x="date", y="base_rate_diff")
+    import plotly.express as px
+
+    changes = get_tariff_changes()
+    # the same hover label for every tariff so a tariff change only patches `y`
+    figure = px.bar(changes, x="date", y=tariff, labels={tariff: "change"})
     figure.update_layout(xaxis_title="Date", yaxis_title="Tariff Rate Change (Vatu)")
     figure.update_traces(marker_color=SOURCE_COLORS[0])
     return figure
 
 
-figure = build_figure_one()
-figure2 = build_figure_two()
-
 # ------
 # Layout
 # ------
 
-figure_controls = dbc.Card(
-    [
-        html.Div(
-            [
-                html.H6("Tariff Category Select", className="mb-0 text-white"),
-                html.P("Select which tariff category is shown in the charts below.", className="small mb-1 text-white"),
-                dcc.Dropdown(
-                    id="tariff-select",
-                    options=[
-                        {"value": t, "label": t.replace("_", " ")} for t in TARIFFS
-                    ],
-                    value="base_rate",
-                    clearable=False,
-                ),
-            ],
-        ),
-    ],
-    body=True,
-    color="primary",
-)
+def figure_controls():
+    return dbc.Card(
+        [
+            html.Div(
+                [
+                    html.H6("Tariff Category Select", className="mb-0 text-white"),
+                    html.P("Select which tariff category is shown in the charts below.", className="small mb-1 text-white"),
+                    dcc.Dropdown(
+                        id="tariff-select",
+                        options=[
+                            {"value": t, "label": t.replace("_", " ")} for t in get_tariffs()
+                        ],
+                        value="base_rate",
+                        clearable=False,
+                    ),
+                ],
+            ),
+        ],
+        body=True,
+        color="primary",
+    )
+
 
 notice = dbc.Alert(
     [
@@ -117,36 +194,39 @@ notice = dbc.Alert(
     color="info",
 )
 
-layout = html.Div(
-    [
-        notice,
-        html.H2("Electricity Prices"),
-        figure_controls,
-        html.Div(
-            [
-                html.H4("Port Vila Electricity & Fuel Price"),
-                html.P(
-                    "This chart shows the price of electricity in Port Vila (measured in Vatu/kwh) against the price of oil (converted to Vatu/barrel) so the relationship between them can be compared."
-                ),
-            ],
-            className="mt-3 mb-0",
-        ),
-        dbc.Row(
-            [
-                dcc.Graph(id="graph2", figure=figure),
-            ],
-        ),
-        html.H4("Electricity Price Change Per Month"),
-        html.P(
-            "This chart shows the amount of change (measured in Vatu) in the electricity tariff rate compared to the month before it. Effectively showing how much the electricity price changes each month"
-        ),
-        dbc.Row(
-            [
-                dcc.Graph(id="graph3", figure=figure2),
-            ]
-        ),
-    ]
-)
+
+@with_snapshot
+def layout():
+    return html.Div(
+        [
+            notice,
+            html.H2("Electricity Prices"),
+            figure_controls(),
+            html.Div(
+                [
+                    html.H4("Port Vila Electricity & Fuel Price"),
+                    html.P(
+                        "This chart shows the price of electricity in Port Vila (measured in Vatu/kwh) against the price of oil (converted to Vatu/barrel) so the relationship between them can be compared."
+                    ),
+                ],
+                className="mt-3 mb-0",
+            ),
+            dbc.Row(
+                [
+                    dcc.Graph(id="graph2", figure=build_figure_one()),
+                ],
+            ),
+            html.H4("Electricity Price Change Per Month"),
+            html.P(
+                "This chart shows the amount of change (measured in Vatu) in the electricity tariff rate compared to the month before it. Effectively showing how much the electricity price changes each month"
+            ),
+            dbc.Row(
+                [
+                    dcc.Graph(id="graph3", figure=build_figure_two()),
+                ]
+            ),
+        ]
+    )
 
 
 @callback(
@@ -155,8 +235,49 @@ layout = html.Div(
     [
         Input("tariff-select", "value"),
     ],
+    prevent_initial_call=True,
 )
-def update_figure_tariff(tariff):
-    figure = build_figure_one(tariff)
-    figure2 = build_figure_two(tariff)
-    return figure, figure2
+@with_snapshot
+def update_tariff_chart(tariff):
+    # only the tariff trace changes, the oil prices stay put; its dates are
+    # sent with the rates in case a reload added months since the page was drawn
+    tariff_trace = build_figure_one(tariff)["data"][1]
+    patch = Patch()
+    patch["data"][1]["x"] = tariff_trace["x"]
+    patch["data"][1]["y"] = tariff_trace["y"]
+    change_trace = build_figure_two(tariff)["data"][0]
+    patch2 = Patch()
+    patch2["data"][0]["x"] = change_trace["x"]
+    patch2["data"][0]["y"] = change_trace["y"]
+    return patch, patch2
+
+
+def zoomed_range(relayout: dict) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """The x range of a `relayoutData` event, (None, None) when zoomed out."""
+    if relayout.get("xaxis.autorange"):
+        return None, None
+    if "xaxis.range[0]" in relayout:
+        return relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]
+    if "xaxis.range" in relayout:
+        return tuple(relayout["xaxis.range"])
+    # resizing, panning the y axes or anything else that leaves the dates alone
+    return None
+
+
+if DAILY_PRICES:
+    @callback(
+        Output("graph2", "figure", allow_duplicate=True),
+        Input("graph2", "relayoutData"),
+        prevent_initial_call=True,
+    )
+    @with_snapshot
+    def zoom_oil_prices(relayout):
+        # redraw only the visible days, at full resolution once few enough are shown
+        zoomed = zoomed_range(relayout or {})
+        if zoomed is None:
+            raise PreventUpdate
+        dates, prices = daily_oil_window(*zoomed)
+        patch = Patch()
+        patch["data"][0]["x"] = dates.tolist()
+        patch["data"][0]["y"] = compact_array(prices.tolist(), 0)
+        return patch
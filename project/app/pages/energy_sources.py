@@ -1,10 +1,25 @@
-from dash import html, dcc, Input, Output, callback, register_page
+from typing import Optional
+
+from dash import (
+    html,
+    dcc,
+    Input,
+    Output,
+    State,
+    Patch,
+    callback,
+    clientside_callback,
+    ClientsideFunction,
+    no_update,
+    register_page,
+)
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-import plotly.express as px
 import pandas as pd
 
-from app.config import SOURCE_COLORS, SOURCE_LABELS
+from app.cache import cached_figure
+from app.config import ENERGY_SOURCES_CLIENTSIDE, SOURCE_COLORS, SOURCE_LABELS
+from app.data import get_ura_cube, with_snapshot
 
 
 register_page(__name__, top_nav=True)
@@ -13,31 +28,22 @@ register_page(__name__, top_nav=True)
 # Setup
 # -----
 
-df = pd.read_csv("app/ura-market-snapshots.csv", thousands=",")
-# Update 'Malekula' location to use more accurate location name to match later reports
-df.loc[df["location"] == "Malekula", "location"] = "Malekula- Lakatoro"
 # TODO percent renewable or something by location (map view?) 3D map view?
 
-DATES = sorted(list(set(df["date"].values)))
-LOCATIONS = ["Vanuatu"] + list(set(df["location"].values))
-
 
+@cached_figure("ura", precision=0)
 def build_line_chart(location: str = "Vanuatu"):
+    cube = get_ura_cube()
     figure = go.Figure()
     figure.update_yaxes(title_text="kWh Produced")
-    for source, color in zip(SOURCE_LABELS, SOURCE_COLORS):
+    series = cube.series(location)
+    for i, (source, color) in enumerate(zip(SOURCE_LABELS, SOURCE_COLORS)):
         legendgroup = "non-renewable" if source == "diesel" else "renewable"
-        y = []
-        for date in DATES:
-            data = df.query(f"source=='{source}' & date=='{date}'")
-            if location != "Vanuatu":
-                data = data.query(f"location=='{location}'")
-            y.append(data["kwh"].sum())
         figure.add_trace(
             go.Scatter(
                 name=source,
-                x=DATES,
-                y=y,
+                x=cube.dates,
+                y=series[:, i],
                 line=dict(width=2, color=color),
                 stackgroup="one",
                 legendgroup=legendgroup,
@@ -58,11 +64,9 @@ def build_line_chart(location: str = "Vanuatu"):
     return figure
 
 
+@cached_figure("ura", precision=0)
 def build_pie_chart(location: str, date):
-    data = df.query(f"date=='{date}'")
-    if location != "Vanuatu":
-        data = data.query(f"location=='{location}'")
-    values = [data.query(f"source=='{s}'")["kwh"].sum() for s in SOURCE_LABELS]
+    values = get_ura_cube().snapshot(location, date)
     figure = go.Figure(
         data=[
             go.Pie(
@@ -77,26 +81,14 @@ def build_pie_chart(location: str, date):
     return figure
 
 
+@cached_figure("ura", precision=4)
 def build_renewable_percent_chart(location: str = "Vanuatu"):
-    values = []
-    for date in DATES:
-        renewable = 0
-        nonrenewable = 0
-        if location != "Vanuatu":
-            data = df.query(f"date=='{date}' & location=='{location}'")
-        else:
-            data = df.query(f"date=='{date}'")
-        for source in SOURCE_LABELS:
-            subtotal = data.loc[data["source"] == source]["kwh"].sum()
-            if source == "diesel":
-                nonrenewable = subtotal
-            else:
-                renewable += subtotal
-        total_production = renewable + nonrenewable
-        renewable_percent = renewable / total_production
-        values.append((date, renewable_percent))
-    
-    renewable_df = pd.DataFrame(values, columns=["date", "percent"])
+    import plotly.express as px
+
+    cube = get_ura_cube()
+    renewable_df = pd.DataFrame(
+        {"date": cube.dates, "percent": cube.renewable_percent(location)}
+    )
     figure = px.area(renewable_df, x="date", y="percent")
     figure.update_layout(yaxis_title="Percent Renewable Energy Produced")
     figure.update_yaxes(range=[0, 1])
@@ -105,43 +97,80 @@ def build_renewable_percent_chart(location: str = "Vanuatu"):
     return figure
 
 
-figure = build_line_chart()
-figure2 = build_renewable_percent_chart()
+def build_clientside_payload():
+    """
+    Everything the browser needs to redraw the charts for any location
+    and date. The national figures are sent as templates and the
+    clientside callback in `assets/energy_sources.js` swaps in the
+    values of the selected location.
+    """
+    cube = get_ura_cube()
+    figures = dict(
+        line=build_line_chart(),
+        pie=build_pie_chart("Vanuatu", cube.dates[-1]),
+        renewable=build_renewable_percent_chart(),
+    )
+    # every figure shares the same template so only send it once
+    template = figures["line"]["layout"]["template"]
+    figures = {
+        name: dict(
+            data=figure["data"],
+            layout={k: v for k, v in figure["layout"].items() if k != "template"},
+        )
+        for name, figure in figures.items()
+    }
+    return dict(
+        dates=cube.dates,
+        sources=cube.sources,
+        renewable=cube.renewable_mask.tolist(),
+        # kWh by location then source, rounded to whole kWh to keep the payload small
+        kwh={
+            location: cube.series(location).round().T.astype(int).tolist()
+            for location in cube.locations
+        },
+        figures=figures,
+        template=template,
+    )
+
 
 # ------
 # Layout
 # ------
 
-controls = dbc.Card(
-    [
-        html.Div(
-            [
-                html.H6("Location", className="text-white my-1"),
-                dcc.Dropdown(
-                    id="location-select",
-                    options=LOCATIONS,
-                    value="Vanuatu",
-                    clearable=False,
-                ),
-            ],
-            className="mb-3"
-        ),
-        html.Div(
-            [
-                html.H6("Date", className="text-white mb-0"),
-                html.P("Select date to view pie chart for selected date.", className="small text-white mb-1"),
-                dcc.Dropdown(
-                    id="date-select",
-                    options=list(reversed(DATES)),
-                    value=None,
-                    clearable=True,
-                ),
-            ],
-        ),
-    ],
-    body=True,
-    color="primary",
-)
+
+def controls():
+    cube = get_ura_cube()
+    return dbc.Card(
+        [
+            html.Div(
+                [
+                    html.H6("Location", className="text-white my-1"),
+                    dcc.Dropdown(
+                        id="location-select",
+                        options=cube.locations,
+                        value="Vanuatu",
+                        clearable=False,
+                    ),
+                ],
+                className="mb-3"
+            ),
+            html.Div(
+                [
+                    html.H6("Date", className="text-white mb-0"),
+                    html.P("Select date to view pie chart for selected date.", className="small text-white mb-1"),
+                    dcc.Dropdown(
+                        id="date-select",
+                        options=list(reversed(cube.dates)),
+                        value=None,
+                        clearable=True,
+                    ),
+                ],
+            ),
+        ],
+        body=True,
+        color="primary",
+    )
+
 
 alert = dbc.Alert(
     [
@@ -163,62 +192,127 @@ alert = dbc.Alert(
     color="warning",
 )
 
-layout = html.Div(
-    [
-        alert,
-        html.H2("Energy Sources"),
-        html.P(
-            """
-                This chart shows the amount of kilowatt/hours produced by each reported source of energy.
-                Use the form below to update the charts and show the data of a specific region and/or date.
-            """
-        ),
-        controls,
-        html.Div(
-            [
-                html.H4("Total Production by Energy Source"),
-                html.P(
-                    "This chart shows amount electricity produced (measured in kwh) as well as the amount that various energy sources contribute to that demand so the relationship between them can be compared."
-                ),
-            ],
-            className="mt-3 mb-0",
-        ),
-        dbc.Row(
-            [
-                dcc.Graph(id="graph", figure=figure),
-            ]
-        ),
-        html.Div(
-            [
-                html.H4("Renewable Energy Production"),
-                html.P(
-                    "This chart shows percentage of electricity produced with renewable sources."
-                ),
-            ],
-            className="mt-3 mb-0",
-        ),
-        dbc.Row(
-            [
-                dcc.Graph(id="graphA", figure=figure2),
-            ]
+
+@with_snapshot
+def layout():
+    stores = [
+        # data for redrawing the charts in the browser without a server callback
+        dcc.Store(
+            id="ura-cube-store",
+            data=build_clientside_payload() if ENERGY_SOURCES_CLIENTSIDE else None,
         ),
+        # the selection the server callbacks redraw when the browser can't
+        dcc.Store(id="ura-figure-request"),
     ]
-)
 
+    return html.Div(
+        [
+            alert,
+            html.H2("Energy Sources"),
+            html.P(
+                """
+                    This chart shows the amount of kilowatt/hours produced by each reported source of energy.
+                    Use the form below to update the charts and show the data of a specific region and/or date.
+                """
+            ),
+            controls(),
+            html.Div(
+                [
+                    html.H4("Total Production by Energy Source"),
+                    html.P(
+                        "This chart shows amount electricity produced (measured in kwh) as well as the amount that various energy sources contribute to that demand so the relationship between them can be compared."
+                    ),
+                ],
+                className="mt-3 mb-0",
+            ),
+            dbc.Row(
+                [
+                    dcc.Graph(id="graph", figure=build_line_chart()),
+                ]
+            ),
+            html.Div(
+                [
+                    html.H4("Renewable Energy Production"),
+                    html.P(
+                        "This chart shows percentage of electricity produced with renewable sources."
+                    ),
+                ],
+                className="mt-3 mb-0",
+            ),
+            dbc.Row(
+                [
+                    dcc.Graph(id="graphA", figure=build_renewable_percent_chart()),
+                ]
+            ),
+            *stores,
+        ]
+    )
 
-@callback(
+
+def is_selectable(location: str, date: Optional[str] = None) -> bool:
+    """
+    Whether the current snapshot has the location and date, a page drawn
+    before a reload may still offer ones it dropped.
+    """
+    cube = get_ura_cube()
+    return location in cube.locations and (date is None or date in cube.dates)
+
+
+# the browser redraws the charts from `ura-cube-store` when it holds the
+# payload, otherwise it passes the selection on to the server callbacks; the
+# layout already holds the figures for the initial dropdown values
+clientside_callback(
+    ClientsideFunction(namespace="energy_sources", function_name="update_figures"),
     Output("graph", "figure"),
     Output("graphA", "figure"),
-    [
-        Input("location-select", "value"),
-        Input("date-select", "value"),
-    ],
+    Output("ura-figure-request", "data"),
+    Input("location-select", "value"),
+    Input("date-select", "value"),
+    State("ura-cube-store", "data"),
+    prevent_initial_call=True,
+)
+
+
+@callback(
+    Output("graph", "figure", allow_duplicate=True),
+    Input("ura-figure-request", "data"),
+    prevent_initial_call=True,
 )
-def update_figure_location(location, date):
+@with_snapshot
+def update_sources_chart(request):
+    location, date = request["location"], request["date"]
+    if not is_selectable(location, date):
+        return no_update
     if date is None:
-        fig = build_line_chart(location)
-        fig2 = build_renewable_percent_chart(location)
+        figure = build_line_chart(location)
     else:
-        fig = build_pie_chart(location, date)
-        fig2 = build_renewable_percent_chart(location)
-    return fig, fig2
+        figure = build_pie_chart(location, date)
+    if request["changed"] == "date-select":
+        # switching between the line and pie charts
+        return figure
+    # same chart for another location, only its values change; the
+    # dates go along with them in case a reload added months since the
+    # page was drawn
+    patch = Patch()
+    keys = ("x", "y") if date is None else ("values",)
+    for i, trace in enumerate(figure["data"]):
+        for key in keys:
+            patch["data"][i][key] = trace[key]
+    return patch
+
+
+@callback(
+    Output("graphA", "figure", allow_duplicate=True),
+    Input("ura-figure-request", "data"),
+    prevent_initial_call=True,
+)
+@with_snapshot
+def update_renewable_chart(request):
+    if request["changed"] == "date-select" or not is_selectable(request["location"]):
+        # the renewable chart covers every date
+        return no_update
+    trace = build_renewable_percent_chart(request["location"])["data"][0]
+    patch = Patch()
+    patch["data"][0]["x"] = trace["x"]
+    patch["data"][0]["y"] = trace["y"]
+    return patch
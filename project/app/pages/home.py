@@ -4,23 +4,12 @@ from dash import register_page, html, page_registry
 import dash_bootstrap_components as dbc
 import pandas as pd
 from app.config import TITLE, DESCRIPTION, SOURCE_LABELS
-from app.utils import get_latest_ura_update, get_latest_wti_update, get_unelco_data, get_latest_unelco_update, get_latest_ura_renewable_percent
+from app.data import get_unelco_data, with_snapshot
+from app.utils import get_latest_ura_update, get_latest_unelco_update, get_latest_ura_renewable_percent
 
 
 register_page(__name__, path="/", top_nav=False)
 
-# Unelco
-unelco_data = get_unelco_data()
-latest_unelco_update = get_latest_unelco_update()
-current_rate = unelco_data.iloc[-1]["base_rate"]
-
-# URA
-latest_ura_update = get_latest_ura_update()
-renewable_percent, total_production = get_latest_ura_renewable_percent()
-
-# WTI
-latest_wti_update = get_latest_wti_update()
-
 hero = html.Div(
     dbc.Container(
         [
@@ -67,70 +56,83 @@ def quick_stats_card(title, description, latest_update):
     )
 
 
-quick_stats_section = html.Div(
-    [
-        html.H2("Quick Stats"),
-        dbc.Row(
-            [
-                dbc.Col(
-                    quick_stats_card(
-                        "Electricity Base Rate",
-                        f"{current_rate} Vatu/kWh",
-                        latest_unelco_update,
-                    )
-                ),
-                dbc.Col(
-                    quick_stats_card(
-                        "Total Production",
-                        f"{int(total_production):,} kW/h",
-                        latest_ura_update,
-                    )
-                ),
-                dbc.Col(
-                    quick_stats_card(
-                        "Renewable Production",
-                        f"{renewable_percent:.2%}",
-                        latest_ura_update,
-                    )
-                ),
-            ]
-        ),
-    ],
-)
+def quick_stats_section():
+    # Unelco
+    unelco_data = get_unelco_data()
+    latest_unelco_update = get_latest_unelco_update()
+    current_rate = unelco_data.iloc[-1]["base_rate"]
 
-layout = html.Div(
-    [
-        hero,
-        quick_stats_section,
-        html.Hr(),
-        html.H2("Explore our pages"),
-        html.Div(
-            [
-                dbc.Button(
-                    page["name"].title(),
-                    color="primary",
-                    outline=True,
-                    size="lg",
-                    href=page["path"],
-                    className="me-2",
-                )
-                for page in page_registry.values()
-                if page["top_nav"] == True
-            ],
-            className="lead",
-        ),
-        # html.Hr(),
-        # data_sources_section,
-        # html.H2("Upcoming Service Disruptions"),
-        # TODO
-        #
-        # html.H2("Data Sources"),
-        # dbc.Row(
-        #     [
-        #         dbc.Col(info_card("Unelco Tariff Report", "September 2022")),
-        #         dbc.Col(info_card("URA Affordability Report", "March 2022")),
-        #         dbc.Col(info_card("WTI Oil Prices", "September 2022")),
-        #     ]
-        # ),
-    ],
-)
+    # URA
+    latest_ura_update = get_latest_ura_update()
+    renewable_percent, total_production = get_latest_ura_renewable_percent()
+
+    return html.Div(
+        [
+            html.H2("Quick Stats"),
+            dbc.Row(
+                [
+                    dbc.Col(
+                        quick_stats_card(
+                            "Electricity Base Rate",
+                            f"{current_rate} Vatu/kWh",
+                            latest_unelco_update,
+                        )
+                    ),
+                    dbc.Col(
+                        quick_stats_card(
+                            "Total Production",
+                            f"{int(total_production):,} kW/h",
+                            latest_ura_update,
+                        )
+                    ),
+                    dbc.Col(
+                        quick_stats_card(
+                            "Renewable Production",
+                            f"{renewable_percent:.2%}",
+                            latest_ura_update,
+                        )
+                    ),
+                ]
+            ),
+        ],
+    )
+
+
+@with_snapshot
+def layout():
+    return html.Div(
+        [
+            hero,
+            quick_stats_section(),
+            html.Hr(),
+            html.H2("Explore our pages"),
+            html.Div(
+                [
+                    dbc.Button(
+                        page["name"].title(),
+                        color="primary",
+                        outline=True,
+                        size="lg",
+                        href=page["path"],
+                        className="me-2",
+                    )
+                    for page in page_registry.values()
+                    if page["top_nav"] == True
+                ],
+                className="lead",
+            ),
+            # html.Hr(),
+            # data_sources_section,
+            # html.H2("Upcoming Service Disruptions"),
+            # TODO
+            #
+            # html.H2("Data Sources"),
+            # dbc.Row(
+            #     [
+            #         dbc.Col(info_card("Unelco Tariff Report", "September 2022")),
+            #         dbc.Col(info_card("URA Affordability Report", "March 2022")),
+            #         dbc.Col(info_card("WTI Oil Prices", "September 2022")),
+            #     ]
+            # ),
+        ],
+    )
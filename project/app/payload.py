@@ -0,0 +1,214 @@
+"""
+Smaller figure payloads.
+
+Every dropdown change sends whole figures to the browser so the numbers in
+them are trimmed before they are cached:
+
+* each trace's values are rounded to the precision the builder asks for,
+  `cached_figure("ura", precision=0)` or a dict of trace name to decimals;
+* numeric arrays are sent as Plotly typed arrays, base64 encoded binary
+  `{"dtype": "i4", "bdata": "..."}`, whenever that is shorter than the
+  JSON list;
+* JSON is read and written with orjson when it's installed, Plotly and
+  Dash already use it for serializing when it is;
+* responses are compressed with brotli or gzip, whichever the browser
+  accepts (set COMPRESS=0 to leave that to a reverse proxy).
+
+    python -m app.payload [--each]
+
+reports the bytes on the wire for every figure before and after.
+"""
+import argparse
+import base64
+import gzip
+import json
+import math
+from collections import defaultdict
+from numbers import Number
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from app.config import COMPRESS
+
+Precision = Union[int, Dict[str, int], None]
+
+BROTLI_LEVEL = 5
+# arrays shorter than this are rounded but not worth encoding
+ENCODE_MIN_LENGTH = 8
+# the trace attributes holding data, rounded to the builder's precision
+VALUE_KEYS = {"x", "y", "z", "values"}
+INT_DTYPES = [
+    ("u1", np.uint8),
+    ("i1", np.int8),
+    ("u2", np.uint16),
+    ("i2", np.int16),
+    ("u4", np.uint32),
+    ("i4", np.int32),
+]
+
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def loads(data: Union[str, bytes]):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _is_numeric(values) -> bool:
+    return (
+        isinstance(values, list)
+        and len(values) > 0
+        and all(
+            v is None or (isinstance(v, Number) and not isinstance(v, bool))
+            for v in values
+        )
+    )
+
+
+def typed_array(values: np.ndarray) -> dict:
+    """The smallest Plotly typed array holding `values` exactly."""
+    finite = values[np.isfinite(values)]
+    if len(finite) == len(values) and np.array_equal(finite, np.trunc(finite)):
+        low, high = (finite.min(), finite.max()) if len(finite) else (0, 0)
+        for dtype, numpy_type in INT_DTYPES:
+            info = np.iinfo(numpy_type)
+            if info.min <= low and high <= info.max:
+                data = values.astype(np.dtype(numpy_type).newbyteorder("<"))
+                break
+        else:
+            dtype, data = "f8", values.astype("<f8")
+    else:
+        dtype, data = "f8", values.astype("<f8")
+    return {"dtype": dtype, "bdata": base64.b64encode(data.tobytes()).decode()}
+
+
+def compact_array(values: list, decimals: Optional[int]) -> Union[list, dict]:
+    if decimals is None and len(values) < ENCODE_MIN_LENGTH:
+        return values
+    array = np.array([np.nan if v is None else v for v in values], dtype="f8")
+    if decimals is not None:
+        array = array.round(decimals)
+    as_list = [None if math.isnan(v) else v for v in array.tolist()]
+    if decimals is not None and decimals <= 0:
+        as_list = [None if v is None else int(v) for v in as_list]
+    if len(as_list) < ENCODE_MIN_LENGTH:
+        return as_list
+    encoded = typed_array(array)
+    # text wins for short decimals, e.g. percentages rounded to 0.1234
+    if len(encoded["bdata"]) + 25 < len(dumps(as_list)):
+        return encoded
+    return as_list
+
+
+def trace_decimals(trace: dict, precision: Precision) -> Optional[int]:
+    if isinstance(precision, dict):
+        return precision.get(trace.get("name", ""))
+    return precision
+
+
+def compact_figure(figure: dict, precision: Precision = None) -> dict:
+    """Round and encode the numeric arrays of each trace in `figure`."""
+    for trace in figure.get("data", []):
+        decimals = trace_decimals(trace, precision)
+        for key, values in trace.items():
+            if _is_numeric(values):
+                # styling arrays such as a pie's `pull` keep their values
+                rounding = decimals if key in VALUE_KEYS else None
+                trace[key] = compact_array(values, rounding)
+    return figure
+
+
+def install(app):
+    """Compress responses with brotli or gzip as negotiated by Accept-Encoding."""
+    if not COMPRESS:
+        return
+    from flask_compress import Compress
+
+    # brotli for browsers that accept it, at level 5 it's a few percent smaller
+    # than gzip on a figure and still takes well under a millisecond
+    app.server.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+    app.server.config["COMPRESS_BR_LEVEL"] = BROTLI_LEVEL
+    Compress(app.server)
+
+
+def wire_sizes(payload: bytes) -> Dict[str, int]:
+    import brotli
+
+    return dict(
+        raw=len(payload),
+        gzip=len(gzip.compress(payload, 6)),
+        br=len(brotli.compress(payload, quality=BROTLI_LEVEL)),
+    )
+
+
+def report(each: bool = False) -> str:
+    import plotly.io as pio
+
+    from app.prerender import figure_variants
+
+    header = (
+        f"  {'figure':<48}"
+        + "".join(f"{name:>10}" for name in ("json", "gzip", "br"))
+        + "".join(f"{name:>10}" for name in ("compact", "gzip", "br"))
+        + f"{'saved':>8}"
+    )
+    lines = ["bytes on the wire per figure", header]
+    totals: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    counts: Dict[str, int] = defaultdict(int)
+
+    def row(label: str, sizes: Dict[str, int], count: int = 1) -> str:
+        # responses weren't compressed before, so compare with the plain JSON
+        before = sizes["before_raw"]
+        saved = 1 - sizes["after_br"] / before if before else 0
+        return (
+            f"  {label:<48}"
+            + "".join(
+                f"{sizes[f'{stage}_{kind}'] // count:>10}"
+                for stage in ("before", "after")
+                for kind in ("raw", "gzip", "br")
+            )
+            + f"{saved:>8.0%}"
+        )
+
+    for builder, args in figure_variants():
+        before = pio.to_json(builder.uncached(*args)).encode()
+        after = dumps(builder.render(*args))
+        sizes = {
+            f"{stage}_{kind}": size
+            for stage, payload in (("before", before), ("after", after))
+            for kind, size in wire_sizes(payload).items()
+        }
+        name = builder.__name__
+        counts[name] += 1
+        for kind, size in sizes.items():
+            totals[name][kind] += size
+        if each:
+            lines.append(row(f"{name}{args}", sizes))
+    if each:
+        lines.append("")
+    lines.append("mean of every variant")
+    for name, sizes in totals.items():
+        lines.append(row(f"{name} ({counts[name]})", sizes, counts[name]))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the size of every figure.")
+    parser.add_argument("--each", action="store_true", help="list every figure")
+    args = parser.parse_args()
+    print(report(args.each))
+
+
+if __name__ == "__main__":
+    main()
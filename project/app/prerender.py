@@ -0,0 +1,69 @@
+"""
+Render every figure the app can show ahead of time.
+
+    python -m app.prerender
+
+The energy pages only draw figures for a closed set of dropdown values so
+all of them are written as JSON to PRERENDER_DIR along with a manifest
+recording the dataset versions they were built from. The figure cache
+serves these files instead of calling the builders at request time and
+ignores the directory once the data changes.
+"""
+import argparse
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from app.config import PRERENDER_DIR
+from app.data import LOADERS, dataset_version, get_ura_cube
+
+
+def figure_variants():
+    # the pages can only be imported once the Dash app exists
+    import app.app  # noqa: F401
+
+    energy_sources = sys.modules["pages.energy_sources"]
+    energy_prices = sys.modules["pages.energy_prices"]
+
+    cube = get_ura_cube()
+    for location in cube.locations:
+        yield energy_sources.build_line_chart, (location,)
+        yield energy_sources.build_renewable_percent_chart, (location,)
+        for date in cube.dates:
+            yield energy_sources.build_pie_chart, (location, date)
+    for tariff in energy_prices.get_tariffs():
+        yield energy_prices.build_figure_one, (tariff,)
+        yield energy_prices.build_figure_two, (tariff,)
+
+
+def prerender(output: Path) -> int:
+    from app.cache import figure_path, write_figure
+
+    if output.exists():
+        shutil.rmtree(output)
+    output.mkdir(parents=True)
+    count = 0
+    for builder, args in figure_variants():
+        write_figure(figure_path(output, builder.key(*args)), builder.render(*args))
+        count += 1
+    manifest = dict(version=dataset_version(*LOADERS), figures=count)
+    (output / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", type=Path, default=Path(PRERENDER_DIR))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = prerender(args.output)
+    print(
+        f"Rendered {count} figures to {args.output} in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
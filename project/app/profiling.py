@@ -0,0 +1,170 @@
+"""
+Profiling mode.
+
+Set PROFILE=1 to run a sample of the requests (PROFILE_SAMPLE_RATE, 0.1 by
+default) under cProfile and write, for each one, the CPU profile and a
+tracemalloc snapshot of the memory still allocated when it finished to
+PROFILE_DIR. The files are named after the route and, for callback
+requests, the callback:
+
+    20221104-101530-812-0-_dash-update-component-update_sources_chart.prof
+    20221104-101530-812-0-_dash-update-component-update_sources_chart.tracemalloc
+
+On startup the memory allocated while importing each page module and
+rendering its first layout is written to `startup-<pid>.txt` next to them.
+Read the files with
+
+    python -m app.profiling show FILE [--limit 30]
+    python -m app.profiling diff OLD.tracemalloc NEW.tracemalloc
+
+Only one request per worker is profiled at a time, requests arriving while
+another is being profiled are passed through untouched.
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from itertools import count
+from pathlib import Path
+
+import flask
+
+from app import startup
+from app.config import PROFILE, PROFILE_DIR, PROFILE_SAMPLE_RATE
+from app.metrics import CALLBACK_PATH, callback_name
+
+# frames kept for each allocation, enough to see which page or figure builder it came from
+TRACEBACK_LIMIT = 25
+SKIPPED_PATHS = ("/assets/", "/_dash-component-suites/", "/_favicon.ico", "/metrics")
+
+_busy = threading.Lock()
+_sequence = count()
+
+
+def start():
+    """Start tracing allocations, before the pages are imported."""
+    if not PROFILE:
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEBACK_LIMIT)
+    startup.track_pages()
+
+
+def _tag(app) -> str:
+    tag = flask.request.path.strip("/") or "index"
+    if flask.request.path.endswith(CALLBACK_PATH):
+        tag += "-" + callback_name(app)
+    return re.sub(r"[^\w.-]+", "_", tag)[:100]
+
+
+def _output_path(tag: str, suffix: str) -> Path:
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return Path(PROFILE_DIR) / f"{stamp}-{os.getpid()}-{next(_sequence)}-{tag}{suffix}"
+
+
+def _kib(size: int) -> str:
+    return f"{size / 1024:>10.1f}"
+
+
+def startup_memory_report() -> str:
+    from dash import page_registry
+
+    lines = ["page imports (KiB)"]
+    for page, size in startup.page_memory():
+        lines.append(f"  {page:<28}{_kib(size)}")
+    # the first render loads the datasets each page needs
+    lines.append("first layout render (KiB)")
+    for page in page_registry.values():
+        layout = page["layout"]
+        if not callable(layout):
+            continue
+        before = tracemalloc.get_traced_memory()[0]
+        layout()
+        lines.append(
+            f"  {page['module']:<28}{_kib(tracemalloc.get_traced_memory()[0] - before)}"
+        )
+    current, peak = tracemalloc.get_traced_memory()
+    lines.append(f"traced {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB")
+    lines.append("largest allocations")
+    for stat in tracemalloc.take_snapshot().statistics("lineno")[:20]:
+        lines.append(f"  {stat}")
+    return "\n".join(lines)
+
+
+def install(app):
+    """Add the sampling hooks to the Dash app's server and write the startup breakdown."""
+    if not PROFILE:
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEBACK_LIMIT)
+    Path(PROFILE_DIR).mkdir(parents=True, exist_ok=True)
+    report = Path(PROFILE_DIR) / f"startup-{os.getpid()}.txt"
+    report.write_text(startup_memory_report() + "\n")
+    server = app.server
+
+    def start_profile():
+        if flask.request.path.startswith(SKIPPED_PATHS):
+            return
+        if random.random() >= PROFILE_SAMPLE_RATE or not _busy.acquire(blocking=False):
+            return
+        profiler = cProfile.Profile()
+        flask.g.profiler = profiler
+        profiler.enable()
+
+    # run before Dash's own hooks so the first request's page setup is included
+    server.before_request_funcs.setdefault(None, []).insert(0, start_profile)
+
+    @server.teardown_request
+    def write_profile(exc):
+        profiler = flask.g.pop("profiler", None)
+        if profiler is None:
+            return
+        try:
+            profiler.disable()
+            tag = _tag(app)
+            profiler.dump_stats(_output_path(tag, ".prof"))
+            tracemalloc.take_snapshot().dump(str(_output_path(tag, ".tracemalloc")))
+        finally:
+            _busy.release()
+
+
+def show(path: Path, limit: int):
+    if path.suffix == ".tracemalloc":
+        snapshot = tracemalloc.Snapshot.load(str(path))
+        for stat in snapshot.statistics("lineno")[:limit]:
+            print(stat)
+    else:
+        pstats.Stats(str(path)).sort_stats("cumulative").print_stats(limit)
+
+
+def diff(old: Path, new: Path, limit: int):
+    before = tracemalloc.Snapshot.load(str(old))
+    after = tracemalloc.Snapshot.load(str(new))
+    for stat in after.compare_to(before, "lineno")[:limit]:
+        print(stat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read the files written by PROFILE=1.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show_parser = commands.add_parser("show", help="print a .prof or .tracemalloc file")
+    show_parser.add_argument("path", type=Path)
+    diff_parser = commands.add_parser("diff", help="compare two .tracemalloc files")
+    diff_parser.add_argument("old", type=Path)
+    diff_parser.add_argument("new", type=Path)
+    for command in (show_parser, diff_parser):
+        command.add_argument("--limit", type=int, default=30)
+    args = parser.parse_args()
+    if args.command == "show":
+        show(args.path, args.limit)
+    else:
+        diff(args.old, args.new, args.limit)
+
+
+if __name__ == "__main__":
+    main()
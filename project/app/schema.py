@@ -0,0 +1,168 @@
+"""
+Column types of the datasets, checked and applied as each one is loaded.
+
+The URA market snapshots are the largest dataset and the one the energy
+sources charts filter and group, so they are stored compactly:
+
+* `date` as monthly periods rather than "YYYY-MM" strings;
+* `location` and `source` as categoricals, every location under the one
+  name the ETL resolved its aliases to;
+* `kwh` as whole kWh in a nullable int32, the reports give a total and a
+  percentage per source so there was never more precision than that and
+  a location which didn't report stays missing rather than 0.
+
+The tariffs, oil prices and exchange rates are plotted as they are so
+their dates stay strings; only their format and the numeric columns are
+checked. A dataset which doesn't match its schema raises a SchemaError
+naming the problem so bad ETL output is caught when the app loads it
+rather than drawn.
+"""
+from typing import Callable, Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.config import SOURCE_LABELS
+
+# locations renamed by later reports, resolved by scripts/parseUraMarketSnapshotData.py
+LOCATION_ALIASES = {"Malekula": "Malekula- Lakatoro"}
+
+MONTH_PATTERN = r"^\d{4}-\d{2}$"
+DAY_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def _require(name: str, frame: pd.DataFrame, columns: Sequence[str]):
+    missing = [column for column in columns if column not in frame.columns]
+    if missing:
+        raise SchemaError(f"{name} is missing the columns {', '.join(missing)}")
+
+
+def _check_dates(name: str, dates: pd.Series, *patterns: str):
+    if dates.isna().any():
+        raise SchemaError(f"{name} has rows without a date")
+    if not any(dates.str.match(pattern).all() for pattern in patterns):
+        bad = dates[~dates.str.match(patterns[0])].iloc[0]
+        raise SchemaError(f"{name} has dates like {bad!r}")
+
+
+def _numeric(
+    name: str, frame: pd.DataFrame, columns: Sequence[str]
+) -> Dict[str, pd.Series]:
+    converted = {}
+    for column in columns:
+        try:
+            values = pd.to_numeric(frame[column]).astype("float64", copy=False)
+        except (ValueError, TypeError) as exc:
+            raise SchemaError(f"{name}.{column} isn't numeric: {exc}") from None
+        if (values < 0).any():
+            raise SchemaError(f"{name}.{column} has negative values")
+        converted[column] = values
+    return converted
+
+
+def _replace(frame: pd.DataFrame, columns: Dict[str, pd.Series]) -> pd.DataFrame:
+    """`frame` with `columns` swapped in, sharing every column that didn't change."""
+    changed = {
+        column: values
+        for column, values in columns.items()
+        if values.dtype != frame[column].dtype
+    }
+    if not changed:
+        return frame
+    # `assign` would deep copy the columns which are kept as they are
+    frame = frame.copy(deep=False)
+    for column, values in changed.items():
+        frame[column] = values
+    return frame
+
+
+def ura(frame: pd.DataFrame) -> pd.DataFrame:
+    _require("ura", frame, ["date", "location", "source", "kwh"])
+    aliases = set(frame["location"].unique()) & LOCATION_ALIASES.keys()
+    if aliases:
+        raise SchemaError(
+            f"ura has the location aliases {', '.join(sorted(aliases))}, "
+            "rerun scripts/parseUraMarketSnapshotData.py"
+        )
+    unknown = set(frame["source"].unique()) - set(SOURCE_LABELS)
+    if unknown:
+        raise SchemaError(f"ura has unknown sources {', '.join(sorted(unknown))}")
+    # parse each month once rather than once per row
+    date_codes, months = pd.factorize(frame["date"])
+    if (date_codes < 0).any():
+        raise SchemaError("ura has rows without a date")
+    if not isinstance(months, pd.PeriodIndex):
+        _check_dates("ura", pd.Series(months), MONTH_PATTERN)
+        months = pd.PeriodIndex(pd.to_datetime(months, format="%Y-%m"), freq="M")
+    kwh = _numeric("ura", frame, ["kwh"])["kwh"].round()
+    if kwh.max() > np.iinfo(np.int32).max:
+        raise SchemaError("ura.kwh is too large for int32")
+
+    typed = pd.DataFrame(
+        {
+            "date": months.take(date_codes),
+            "location": pd.Categorical(
+                frame["location"], categories=sorted(frame["location"].unique())
+            ),
+            "source": pd.Categorical(frame["source"], categories=SOURCE_LABELS),
+            "kwh": kwh.astype("Int32").array,
+        }
+    )
+    # compared by code so the periods aren't boxed one by one
+    keys = pd.DataFrame(
+        {
+            "date": date_codes,
+            "location": typed["location"].cat.codes,
+            "source": typed["source"].cat.codes,
+        }
+    )
+    duplicated = keys.duplicated().to_numpy()
+    if duplicated.any():
+        row = typed.loc[duplicated].iloc[0]
+        raise SchemaError(
+            f"ura has more than one row for {row['date']}, {row['location']}, {row['source']}"
+        )
+    return typed
+
+
+def unelco(frame: pd.DataFrame) -> pd.DataFrame:
+    _require("unelco", frame, ["date"])
+    _check_dates("unelco", frame["date"], MONTH_PATTERN, DAY_PATTERN)
+    tariffs = [column for column in frame.columns if column != "date"]
+    return _replace(frame, _numeric("unelco", frame, tariffs))
+
+
+def wti(frame: pd.DataFrame) -> pd.DataFrame:
+    _require("wti", frame, ["date", "price"])
+    _check_dates("wti", frame["date"], DAY_PATTERN)
+    # prices went below zero in April 2020 so only the type is checked
+    try:
+        price = pd.to_numeric(frame["price"]).astype("float64", copy=False)
+    except (ValueError, TypeError) as exc:
+        raise SchemaError(f"wti.price isn't numeric: {exc}") from None
+    return _replace(frame, {"price": price})
+
+
+def exchange_rates(frame: pd.DataFrame) -> pd.DataFrame:
+    _require("exchange_rates", frame, ["date", "exchange_rate"])
+    _check_dates("exchange_rates", frame["date"], MONTH_PATTERN, DAY_PATTERN)
+    return _replace(frame, _numeric("exchange_rates", frame, ["exchange_rate"]))
+
+
+SCHEMAS: Dict[str, Callable[[pd.DataFrame], pd.DataFrame]] = {
+    "unelco": unelco,
+    "ura": ura,
+    "wti": wti,
+    "exchange_rates": exchange_rates,
+    "wti_daily": wti,
+    "exchange_rates_daily": exchange_rates,
+}
+
+
+def apply_schema(name: str, frame: pd.DataFrame) -> pd.DataFrame:
+    """`frame` checked and converted to the types of dataset `name`."""
+    return SCHEMAS[name](frame)
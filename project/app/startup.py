@@ -0,0 +1,113 @@
+"""
+Startup time report.
+
+    python -m app.startup
+
+Breaks down the time taken to import `app.app` into the shared imports,
+each page module Dash discovers and the rest of the app setup, then times
+the first render of every page layout which is where the pages load their
+data and build their figures. Set STARTUP_REPORT=1 to print the import
+part of the report when a worker boots.
+"""
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+PAGES_FOLDER = str(Path(__file__).parent / "pages")
+
+_last = time.perf_counter()
+_marks: List[Tuple[str, float]] = []
+# (page, time, traced memory) as each page starts executing
+_page_events: List[Tuple[str, float, int]] = []
+_pages_mark: Optional[str] = None
+_tracking = False
+_hook_installed = False
+
+
+def _audit_hook(event, args):
+    # Dash executes each page module's code object when it discovers the pages
+    if _tracking and event == "exec":
+        filename = getattr(args[0], "co_filename", "")
+        if filename.startswith(PAGES_FOLDER):
+            _page_events.append((Path(filename).stem, time.perf_counter(), _traced()))
+
+
+def _traced() -> int:
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def track_pages():
+    """Time each page module executed until the next `mark`."""
+    global _tracking, _hook_installed
+    if not _hook_installed:
+        # audit hooks can't be removed so only install one when reporting
+        sys.addaudithook(_audit_hook)
+        _hook_installed = True
+    _tracking = True
+
+
+def mark(name: str):
+    """Record the time since the previous mark (or this module's import)."""
+    global _last, _tracking, _pages_mark
+    now = time.perf_counter()
+    _marks.append((name, now - _last))
+    if _tracking:
+        _tracking = False
+        _pages_mark = name
+        _page_events.append(("", now, _traced()))
+    _last = now
+
+
+def report() -> str:
+    lines = ["startup (ms)"]
+    for name, seconds in _marks:
+        lines.append(f"  {name:<28}{seconds * 1000:>10.1f}")
+        if name == _pages_mark:
+            for (page, start, _), (_, end, _) in zip(_page_events, _page_events[1:]):
+                lines.append(f"    {page:<26}{(end - start) * 1000:>10.1f}")
+    return "\n".join(lines)
+
+
+def page_memory() -> List[Tuple[str, int]]:
+    """
+    Memory allocated while each page module executed, only measured when
+    tracemalloc was tracing as the pages were imported.
+    """
+    return [
+        (page, end - start)
+        for (page, _, start), (_, _, end) in zip(_page_events, _page_events[1:])
+    ]
+
+
+def first_render_report() -> str:
+    from dash import page_registry
+
+    lines = ["first layout render (ms)"]
+    for page in page_registry.values():
+        layout = page["layout"]
+        if not callable(layout):
+            continue
+        start = time.perf_counter()
+        layout()
+        lines.append(
+            f"  {page['module']:<28}{(time.perf_counter() - start) * 1000:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    import os
+
+    # app.app prints the import part of the report
+    os.environ["STARTUP_REPORT"] = "1"
+    start = time.perf_counter()
+    import app.app  # noqa: F401
+
+    print(f"  {'total':<28}{(time.perf_counter() - start) * 1000:>10.1f}")
+    print(first_render_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmarks of the figure builders, the utils helpers and the Dash callbacks.
+
+    pip install pytest pytest-benchmark
+    python -m pytest benchmarks
+
+Every benchmark runs against synthetic data installed in place of the
+bundled CSVs so the results show how each path scales with the number of
+locations and months (and daily rather than monthly price series).
+Compare runs with `--benchmark-autosave` and `--benchmark-compare`.
+"""
+from contextlib import contextmanager
+
+import pytest
+
+# the pages can only be imported once the Dash app exists
+import app.app  # noqa: F401
+from app.cache import figure_cache
+from app.data import install_snapshot
+
+from synthetic import synthetic_snapshot
+
+# (locations, months) of the URA market snapshots, the bundled data is ~10 x 24
+URA_SIZES = [(10, 24), (50, 120), (200, 240)]
+# (months, daily) of the tariff and oil price series
+PRICE_SIZES = [(48, False), (240, False), (48, True), (240, True)]
+
+
+@contextmanager
+def installed(snapshot):
+    previous = install_snapshot(snapshot)
+    try:
+        yield snapshot
+    finally:
+        install_snapshot(previous)
+        figure_cache.clear()
+
+
+@pytest.fixture(
+    scope="session", params=URA_SIZES, ids=[f"{l}x{m}" for l, m in URA_SIZES]
+)
+def ura_data(request):
+    locations, months = request.param
+    return synthetic_snapshot(locations, months)
+
+
+@pytest.fixture(
+    scope="session",
+    params=PRICE_SIZES,
+    ids=[f"{m}{'d' if daily else 'm'}" for m, daily in PRICE_SIZES],
+)
+def price_data(request):
+    months, daily = request.param
+    return synthetic_snapshot(10, months, daily=daily)
+
+
+@pytest.fixture
+def ura_snapshot(ura_data):
+    with installed(ura_data):
+        yield ura_data
+
+
+@pytest.fixture
+def price_snapshot(price_data):
+    with installed(price_data):
+        yield price_data
+
+
+@pytest.fixture
+def client():
+    return app.app.server.test_client()
@@ -0,0 +1,278 @@
+"""
+Load test the Dash callbacks served by gunicorn.
+
+    python benchmarks/loadtest.py [--worker-class sync,gthread,gevent]
+        [--workers 2] [--threads 4] [--concurrency 8] [--duration 20]
+        [--mix update_sources_chart=6,update_renewable_chart=4,update_tariff_chart=3,...]
+        [--url http://localhost:8050]
+
+Starts `gunicorn app.app:server` on a local port for each worker class (the
+same command as the Dockerfile), warms it up and then POSTs a weighted mix
+of `_dash-update-component` requests from `--concurrency` client threads
+for `--duration` seconds. Throughput and p50/p95/p99 latency are reported
+per callback so the worker classes can be compared. Pass `--url` to load
+an already running server instead. The gevent worker needs `pip install
+gevent`.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+PROJECT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+
+from payloads import RandomPayloads  # noqa: E402
+
+CALLBACKS = [
+    "update_sources_chart",
+    "update_renewable_chart",
+    "update_tariff_chart",
+    "toggle_navbar_collapse",
+]
+# a location change fires both energy sources callbacks, a date change only the first
+DEFAULT_MIX = (
+    "update_sources_chart=6,update_renewable_chart=4,"
+    "update_tariff_chart=3,toggle_navbar_collapse=1"
+)
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in CALLBACKS:
+            raise argparse.ArgumentTypeError(f"unknown callback {name!r}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(
+    worker_class: str, workers: int, threads: int
+) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "--preload",
+        "-b",
+        f"127.0.0.1:{port}",
+        "-k",
+        worker_class,
+        "-w",
+        str(workers),
+        "app.app:server",
+    ]
+    if worker_class == "gthread":
+        command[-1:-1] = ["--threads", str(threads)]
+    proc = subprocess.Popen(
+        command, cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            lines = proc.stderr.read().decode().splitlines()
+            errors = [line for line in lines if "Error" in line] or lines or [""]
+            raise RuntimeError(errors[-1].strip())
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/")
+            if connection.getresponse().status == 200:
+                return proc, url
+        except OSError:
+            time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError(f"gunicorn didn't start on port {port}")
+
+
+def stop_server(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+class Client:
+    """One keep-alive connection, reopened when a sync worker closes it."""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(
+            parts.hostname, parts.port, timeout=30
+        )
+        self.path = parts.path.rstrip("/") + "/_dash-update-component"
+
+    def post(self, body: bytes) -> int:
+        try:
+            self.connection.request(
+                "POST", self.path, body, {"Content-Type": "application/json"}
+            )
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.connection.request(
+                "POST", self.path, body, {"Content-Type": "application/json"}
+            )
+        resp = self.connection.getresponse()
+        resp.read()
+        return resp.status
+
+
+def run_load(
+    url: str, mix: Dict[str, int], concurrency: int, duration: float, warmup: int
+) -> Tuple[Dict[str, List[float]], Dict[str, int], float]:
+    payloads = RandomPayloads.from_data()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+
+    def body(name: str) -> bytes:
+        with lock:
+            return json.dumps(getattr(payloads, name)()).encode()
+
+    # fill the figure caches before timing anything
+    client = Client(url)
+    for _ in range(warmup):
+        for name in names:
+            client.post(body(name))
+
+    def worker(seed: int):
+        client = Client(url)
+        choose = random.Random(seed)
+        results = []
+        while time.monotonic() < stop_at:
+            name = choose.choices(names, weights)[0]
+            data = body(name)
+            start = time.perf_counter()
+            try:
+                ok = client.post(data) == 200
+            except (http.client.HTTPException, OSError):
+                ok = False
+            results.append((name, time.perf_counter() - start, ok))
+        return results
+
+    start = time.monotonic()
+    stop_at = start + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for results in executor.map(worker, range(concurrency)):
+            for name, seconds, ok in results:
+                if ok:
+                    latencies[name].append(seconds)
+                else:
+                    errors[name] += 1
+    return latencies, errors, time.monotonic() - start
+
+
+def percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    # nearest rank
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(
+    label: str,
+    latencies: Dict[str, List[float]],
+    errors: Dict[str, int],
+    seconds: float,
+) -> str:
+    lines = [
+        label,
+        f"  {'callback':<26}{'requests':>9}{'errors':>8}{'req/s':>9}"
+        f"{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}",
+    ]
+    everything = []
+    for name in CALLBACKS:
+        if name not in latencies and name not in errors:
+            continue
+        values = latencies[name]
+        everything.extend(values)
+        lines.append(
+            f"  {name:<26}{len(values):>9}{errors[name]:>8}{len(values) / seconds:>9.1f}"
+            + "".join(f"{percentile(values, p) * 1000:>10.1f}" for p in (50, 95, 99))
+        )
+    lines.append(
+        f"  {'total':<26}{len(everything):>9}{sum(errors.values()):>8}"
+        f"{len(everything) / seconds:>9.1f}"
+        + "".join(f"{percentile(everything, p) * 1000:>10.1f}" for p in (50, 95, 99))
+    )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="load this server instead of starting gunicorn")
+    parser.add_argument(
+        "--worker-class",
+        default="sync,gthread",
+        help="comma separated gunicorn worker classes to compare",
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--threads", type=int, default=4, help="threads per gthread worker"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20, help="seconds per run")
+    parser.add_argument("--warmup", type=int, default=20, help="requests per callback")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    args = parser.parse_args()
+
+    # the payloads are read from the same data the server loads
+    os.chdir(PROJECT_DIR)
+    if args.url:
+        runs: List[Tuple[str, Optional[str]]] = [(args.url, None)]
+    else:
+        runs = [(None, name) for name in args.worker_class.split(",")]
+
+    for url, worker_class in runs:
+        proc = None
+        if worker_class is not None:
+            try:
+                proc, url = start_server(worker_class, args.workers, args.threads)
+            except RuntimeError as exc:
+                print(f"{worker_class}: couldn't start gunicorn: {exc}\n")
+                continue
+        try:
+            latencies, errors, seconds = run_load(
+                url, args.mix, args.concurrency, args.duration, args.warmup
+            )
+        finally:
+            if proc is not None:
+                stop_server(proc)
+        label = (
+            url
+            if worker_class is None
+            else (
+                f"{worker_class} x {args.workers}"
+                + (f" ({args.threads} threads)" if worker_class == "gthread" else "")
+            )
+        )
+        label += f", {args.concurrency} clients, {seconds:.0f}s"
+        print(report(label, latencies, errors, seconds) + "\n")
+
+
+if __name__ == "__main__":
+    main()
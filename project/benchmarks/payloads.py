@@ -0,0 +1,119 @@
+"""
+Request bodies the Dash renderer POSTs to `/_dash-update-component`.
+"""
+import hashlib
+import random
+from typing import List, Optional, Sequence, Tuple
+
+Prop = Tuple[str, str]
+PropValue = Tuple[str, str, object]
+
+
+def callback_body(
+    outputs: Sequence[Prop],
+    inputs: Sequence[PropValue],
+    state: Sequence[PropValue] = (),
+    changed: Optional[str] = None,
+) -> dict:
+    """`changed` is the id of the input that triggered it, the first by default."""
+    props = [f"{id}.{prop}" for id, prop in outputs]
+    if len(outputs) == 1:
+        output = props[0]
+        outputs_body = dict(id=outputs[0][0], property=outputs[0][1])
+    else:
+        # multi-output callbacks are keyed as "..id.prop...id.prop.."
+        output = "..{}..".format("...".join(props))
+        outputs_body = [dict(id=id, property=prop) for id, prop in outputs]
+    return dict(
+        output=output,
+        outputs=outputs_body,
+        inputs=[dict(id=id, property=prop, value=value) for id, prop, value in inputs],
+        changedPropIds=[
+            f"{id}.{prop}" for id, prop, _ in inputs if id == (changed or inputs[0][0])
+        ],
+        state=[dict(id=id, property=prop, value=value) for id, prop, value in state],
+    )
+
+
+def duplicate(prop: str, inputs: Sequence[PropValue]) -> str:
+    """The key of an `allow_duplicate` output, suffixed with a hash of the inputs."""
+    hashed = hashlib.sha256(
+        ".".join(f"{id}.{input_prop}" for id, input_prop, _ in inputs).encode("utf-8")
+    ).hexdigest()
+    return f"{prop}@{hashed}"
+
+
+def ura_figure_request(
+    location: str, date: Optional[str] = None, changed: str = "location-select"
+) -> List[PropValue]:
+    """The selection `assets/energy_sources.js` hands the server callbacks."""
+    request = dict(location=location, date=date, changed=changed)
+    return [("ura-figure-request", "data", request)]
+
+
+def update_sources_chart(
+    location: str, date: Optional[str] = None, changed: str = "location-select"
+) -> dict:
+    inputs = ura_figure_request(location, date, changed)
+    return callback_body([("graph", duplicate("figure", inputs))], inputs)
+
+
+def update_renewable_chart(location: str) -> dict:
+    inputs = ura_figure_request(location)
+    return callback_body([("graphA", duplicate("figure", inputs))], inputs)
+
+
+def update_tariff_chart(tariff: str) -> dict:
+    return callback_body(
+        [("graph2", "figure"), ("graph3", "figure")],
+        [("tariff-select", "value", tariff)],
+    )
+
+
+def toggle_navbar_collapse(n_clicks: int, is_open: bool) -> dict:
+    return callback_body(
+        [("navbar-collapse", "is_open")],
+        [("navbar-toggler", "n_clicks", n_clicks)],
+        [("navbar-collapse", "is_open", is_open)],
+    )
+
+
+class RandomPayloads:
+    """Payloads with the dropdown values a visitor could pick."""
+
+    def __init__(
+        self,
+        locations: List[str],
+        dates: List[str],
+        tariffs: List[str],
+        seed: Optional[int] = None,
+    ):
+        self.locations = locations
+        self.dates = dates
+        self.tariffs = tariffs
+        self.random = random.Random(seed)
+
+    @classmethod
+    def from_data(cls, seed: Optional[int] = None) -> "RandomPayloads":
+        from app.data import get_unelco_data, get_ura_cube
+
+        cube = get_ura_cube()
+        tariffs = sorted(set(get_unelco_data().columns) - {"date"})
+        return cls(list(cube.locations), list(cube.dates), tariffs, seed)
+
+    def update_sources_chart(self) -> dict:
+        # the date is cleared more often than not
+        date = self.random.choice(self.dates) if self.random.random() < 0.4 else None
+        changed = "date-select" if self.random.random() < 0.3 else "location-select"
+        return update_sources_chart(self.random.choice(self.locations), date, changed)
+
+    def update_renewable_chart(self) -> dict:
+        return update_renewable_chart(self.random.choice(self.locations))
+
+    def update_tariff_chart(self) -> dict:
+        return update_tariff_chart(self.random.choice(self.tariffs))
+
+    def toggle_navbar_collapse(self) -> dict:
+        return toggle_navbar_collapse(
+            self.random.randint(1, 10), self.random.random() < 0.5
+        )
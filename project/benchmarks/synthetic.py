@@ -0,0 +1,129 @@
+"""
+Synthetic datasets for the benchmarks.
+
+`synthetic_snapshot(locations, months)` builds a `Snapshot` shaped like the
+bundled CSVs with the URA market snapshots scaled to `locations` x `months`.
+With `daily=True` the tariff, WTI and exchange rate series cover the same
+months at daily resolution instead of one row a month. The daily WTI and
+exchange rate datasets of DAILY_PRICES are daily either way. With `store`
+the datasets are written to that SQLite file and left there, as with
+APP_DATA_BACKEND=sqlite.
+"""
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config import SOURCE_LABELS
+from app.database import write_database
+from app.data import LOADERS, Dataset, Snapshot
+from app.schema import apply_schema
+
+START = "2019-01"
+TARIFFS = [
+    "base_rate",
+    "domestic_first_rate",
+    "domestic_second_rate",
+    "domestic_third_rate",
+    "business_rate",
+    "sports_rate",
+    "public_rate",
+    "low_voltage_rate",
+    "high_voltage_rate",
+]
+
+
+def month_range(months: int) -> pd.Index:
+    return pd.period_range(START, periods=months, freq="M").strftime("%Y-%m")
+
+
+def day_range(months: int) -> pd.Index:
+    end = pd.Period(START, freq="M") + (months - 1)
+    return pd.date_range(START, end.end_time.normalize(), freq="D").strftime("%Y-%m-%d")
+
+
+def random_walk(rng: np.random.Generator, start: float, steps: int) -> np.ndarray:
+    return np.abs(start + rng.normal(0, start * 0.02, steps).cumsum()).round(2)
+
+
+def ura_frame(rng: np.random.Generator, locations: int, months: int) -> pd.DataFrame:
+    index = pd.MultiIndex.from_product(
+        [
+            month_range(months),
+            [f"Location {i:04d}" for i in range(locations)],
+            SOURCE_LABELS,
+        ],
+        names=["date", "location", "source"],
+    )
+    frame = index.to_frame(index=False)
+    frame["kwh"] = rng.gamma(2.0, 50_000, len(frame)).round(4)
+    return frame
+
+
+def unelco_frame(rng: np.random.Generator, dates: pd.Index) -> pd.DataFrame:
+    return pd.DataFrame(
+        {"date": dates, **{t: random_walk(rng, 60.0, len(dates)) for t in TARIFFS}}
+    )
+
+
+def wti_frame(rng: np.random.Generator, dates: pd.Index) -> pd.DataFrame:
+    return pd.DataFrame({"date": dates, "price": random_walk(rng, 70.0, len(dates))})
+
+
+def exchange_rate_frame(rng: np.random.Generator, dates: pd.Index) -> pd.DataFrame:
+    rates = random_walk(rng, 0.009, len(dates)).clip(min=0.001)
+    return pd.DataFrame({"date": dates, "exchange_rate": rates.round(4)})
+
+
+def synthetic_frames(locations: int, months: int, daily: bool = False, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    dates = day_range(months) if daily else month_range(months)
+    # the WTI file dates each monthly average on the 15th
+    wti_dates = dates if daily else dates + "-15"
+    return {
+        "unelco": unelco_frame(rng, dates),
+        "ura": ura_frame(rng, locations, months),
+        "wti": wti_frame(rng, wti_dates),
+        "exchange_rates": exchange_rate_frame(rng, dates),
+        # the series behind DAILY_PRICES are always daily
+        "wti_daily": wti_frame(rng, day_range(months)),
+        "exchange_rates_daily": exchange_rate_frame(rng, day_range(months)),
+    }
+
+
+def synthetic_snapshot(
+    locations: int,
+    months: int,
+    daily: bool = False,
+    seed: int = 0,
+    store: Optional[Path] = None,
+) -> Snapshot:
+    frames = synthetic_frames(locations, months, daily, seed)
+    versions = {
+        name: hashlib.sha256(
+            repr((name, locations, months, daily, seed)).encode()
+        ).hexdigest()[:16]
+        for name in LOADERS
+    }
+    if store is not None:
+        write_database(
+            store, {name: (frames[name], versions[name]) for name in LOADERS}
+        )
+    datasets = {}
+    for name in LOADERS:
+        frame = None if store is not None else apply_schema(name, frames[name])
+        datasets[name] = Dataset(
+            name=name,
+            path=Path(f"<synthetic {name}>"),
+            frame=frame,
+            load_seconds=0.0,
+            memory_bytes=0
+            if frame is None
+            else int(frame.memory_usage(deep=True).sum()),
+            version=versions[name],
+            source="synthetic" if store is None else "sqlite",
+            store=store,
+        )
+    return Snapshot(datasets)
@@ -0,0 +1,72 @@
+"""
+The pandas and SQLite backends at 10x and 100x the bundled URA market snapshots.
+
+`test_startup` is what a new worker does before it can draw the energy
+sources charts: the pandas backend parses and types the CSV and builds the
+cube, the SQLite backend only reads the dates and locations. The other
+benchmarks are the slices the charts ask for, read from the cube or
+summed by an indexed query. The bytes a worker holds for the URA data
+are recorded in the extra info.
+"""
+import pytest
+
+from app.cube import NATIONAL, build_cube
+from app.data import load_unelco, load_ura
+from app.database import StoredEnergySources, read_frame
+from app.schema import apply_schema
+
+from synthetic import synthetic_frames, synthetic_snapshot
+
+# (locations, months), the bundled data is ~10 x 24
+SCALES = {"10x": (50, 48), "100x": (100, 240)}
+BACKENDS = ["pandas", "sqlite"]
+
+
+@pytest.fixture(scope="module", params=list(SCALES), ids=list(SCALES))
+def scaled_data(request, tmp_path_factory):
+    locations, months = SCALES[request.param]
+    directory = tmp_path_factory.mktemp(request.param)
+    frames = synthetic_frames(locations, months)
+    for name in ("ura", "unelco"):
+        frames[name].to_csv(directory / f"{name}.csv", index=False)
+    synthetic_snapshot(locations, months, store=directory / "data.sqlite")
+    return directory
+
+
+def load_sources(directory, backend):
+    if backend == "pandas":
+        return build_cube(apply_schema("ura", load_ura(directory / "ura.csv")))
+    return StoredEnergySources(directory / "data.sqlite")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_startup(benchmark, scaled_data, backend):
+    benchmark(load_sources, scaled_data, backend)
+    if backend == "pandas":
+        frame = apply_schema("ura", load_ura(scaled_data / "ura.csv"))
+        held = frame.memory_usage(deep=True).sum() + build_cube(frame).kwh.nbytes
+        benchmark.extra_info["held_bytes"] = int(held)
+    else:
+        benchmark.extra_info["held_bytes"] = 0
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("national", [True, False], ids=["national", "location"])
+def test_series(benchmark, scaled_data, backend, national):
+    sources = load_sources(scaled_data, backend)
+    benchmark(sources.series, NATIONAL if national else sources.locations[1])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_snapshot(benchmark, scaled_data, backend):
+    sources = load_sources(scaled_data, backend)
+    benchmark(sources.snapshot, sources.locations[1], sources.dates[-1])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_read_tariffs(benchmark, scaled_data, backend):
+    if backend == "pandas":
+        path = scaled_data / "unelco.csv"
+        benchmark(lambda: apply_schema("unelco", load_unelco(path)))
+    else:
+        benchmark(read_frame, scaled_data / "data.sqlite", "unelco")
@@ -0,0 +1,67 @@
+"""
+Full callback dispatch through the Flask test client: request parsing,
+the callback, figure building or a figure cache hit and the JSON response.
+"""
+import pytest
+
+from app.cache import figure_cache
+from app.cube import NATIONAL
+from app.data import get_ura_cube
+
+import payloads
+from conftest import installed
+from synthetic import synthetic_snapshot
+
+
+def dispatch(client, body):
+    resp = client.post("/_dash-update-component", json=body)
+    assert resp.status_code == 200, resp.data
+    return resp
+
+
+def update_energy_sources(client, location, date=None):
+    # a location change fires both energy sources callbacks
+    dispatch(client, payloads.update_renewable_chart(location))
+    return dispatch(client, payloads.update_sources_chart(location, date))
+
+
+def update_energy_prices(client, tariff):
+    return dispatch(client, payloads.update_tariff_chart(tariff))
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["build", "cached"])
+def test_energy_sources_callback(benchmark, client, ura_snapshot, cached):
+    cube = get_ura_cube()
+    location, date = cube.locations[1], cube.dates[-1]
+    update_energy_sources(client, location, date)
+    setup = None if cached else figure_cache.clear
+    benchmark.pedantic(
+        update_energy_sources, args=(client, location, date), setup=setup, rounds=20
+    )
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["build", "cached"])
+def test_energy_prices_callback(benchmark, client, price_snapshot, cached):
+    update_energy_prices(client, "business_rate")
+    setup = None if cached else figure_cache.clear
+    benchmark.pedantic(
+        update_energy_prices, args=(client, "business_rate"), setup=setup, rounds=20
+    )
+
+
+@pytest.mark.parametrize("backend", ["pandas", "sqlite"])
+@pytest.mark.parametrize(
+    "body",
+    [
+        payloads.update_sources_chart("Nowhere"),
+        payloads.update_sources_chart(NATIONAL, "1900-01", "date-select"),
+        payloads.update_renewable_chart("Nowhere"),
+    ],
+    ids=["location", "date", "renewable"],
+)
+def test_selection_dropped_by_reload(client, tmp_path, backend, body):
+    # a page drawn before the reload can still send what it offered
+    store = tmp_path / "data.sqlite" if backend == "sqlite" else None
+    with installed(synthetic_snapshot(5, 12, store=store)):
+        resp = client.post("/_dash-update-component", json=body)
+    assert resp.status_code == 204, resp.data
@@ -0,0 +1,36 @@
+"""
+Figure builders without the figure cache, each round builds the figure and
+serializes it to the dict the callbacks return.
+"""
+import sys
+
+from app.data import get_ura_cube
+
+energy_sources = sys.modules["pages.energy_sources"]
+energy_prices = sys.modules["pages.energy_prices"]
+
+
+def a_location():
+    cube = get_ura_cube()
+    return cube.locations[len(cube.locations) // 2]
+
+
+def test_build_line_chart(benchmark, ura_snapshot):
+    benchmark(energy_sources.build_line_chart.render, a_location())
+
+
+def test_build_pie_chart(benchmark, ura_snapshot):
+    date = get_ura_cube().dates[-1]
+    benchmark(energy_sources.build_pie_chart.render, a_location(), date)
+
+
+def test_build_renewable_percent_chart(benchmark, ura_snapshot):
+    benchmark(energy_sources.build_renewable_percent_chart.render, a_location())
+
+
+def test_build_figure_one(benchmark, price_snapshot):
+    benchmark(energy_prices.build_figure_one.render, "business_rate")
+
+
+def test_build_figure_two(benchmark, price_snapshot):
+    benchmark(energy_prices.build_figure_two.render, "business_rate")
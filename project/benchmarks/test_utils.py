@@ -0,0 +1,40 @@
+"""
+The `app.utils` helpers and the values derived from each snapshot.
+"""
+import numpy as np
+import pytest
+
+from app import utils
+from app.cube import build_cube
+from app.downsample import downsample
+
+from synthetic import synthetic_frames
+
+
+def test_build_cube(benchmark, ura_snapshot):
+    benchmark(build_cube, ura_snapshot.frame("ura"))
+
+
+def test_get_latest_ura_update(benchmark, ura_snapshot):
+    benchmark(utils.get_latest_ura_update)
+
+
+def test_get_latest_ura_renewable_percent(benchmark, ura_snapshot):
+    benchmark(utils.get_latest_ura_renewable_percent)
+
+
+def test_get_latest_unelco_update(benchmark, ura_snapshot):
+    # parses "%Y-%m" dates so only runs against the monthly series
+    benchmark(utils.get_latest_unelco_update)
+
+
+def test_get_latest_wti_update(benchmark, price_snapshot):
+    benchmark(utils.get_latest_wti_update)
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+@pytest.mark.parametrize("months", [48, 240])
+def test_downsample(benchmark, months, method):
+    # the daily series of DAILY_PRICES, only loaded in that mode
+    prices = synthetic_frames(1, months)["wti_daily"]["price"].to_numpy()
+    benchmark(downsample, np.arange(len(prices)), prices, 500, method)
@@ -0,0 +1,280 @@
+"""
+Data pipeline runner.
+
+    python manage.py stages
+    python manage.py run [STAGE ...] [--offline] [--force] [--jobs N]
+
+Runs the scripts which fetch, extract and parse each data source and then
+compiles the app's data file and builds its SQLite database. Each stage
+declares the files it reads and writes. A stage is skipped when neither
+its inputs nor its outputs have changed (by hash) since it last
+succeeded. Fetch stages read from the network so they always run unless
+`--offline` is given. Stages run as subprocesses as soon as the stages
+they depend on are done so the independent sources are processed in
+parallel.
+"""
+import hashlib
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import click
+
+PROJECT_DIR = Path(__file__).parent
+sys.path.insert(0, str(PROJECT_DIR / "scripts"))
+
+from manifest import Manifest, file_hash  # noqa: E402
+
+STATE_FILE = PROJECT_DIR / "data" / "pipeline.json"
+UNELCO_DIR = "data/unelco-tariff-reports"
+URA_DIR = "data/ura-affordability-reports"
+EXCHANGE_RATES_DIR = "data/exchange-rates"
+# read here rather than from app.config, which turns it off until the daily
+# prices have been fetched
+DAILY_PRICES = os.environ.get("DAILY_PRICES", "").lower() in ("1", "true")
+APP_DATA = [
+    "app/electricity.csv",
+    "app/ura-market-snapshots.csv",
+    "app/crude-oil-wti.csv",
+    "app/exchange-rates.csv",
+]
+# stages producing the app's data, the daily prices are only compiled in
+# DAILY_PRICES mode so a failed daily fetch doesn't block the rest
+APP_DATA_STAGES = (
+    "extract-unelco",
+    "parse-ura",
+    "fetch-wti",
+    "parse-exchange-rates",
+)
+if DAILY_PRICES:
+    APP_DATA += ["app/crude-oil-wti-daily.csv", "app/exchange-rates-daily.csv"]
+    APP_DATA_STAGES += ("fetch-wti-daily",)
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    command: Tuple[str, ...]
+    inputs: Tuple[str, ...] = ()
+    outputs: Tuple[str, ...] = ()
+    depends: Tuple[str, ...] = ()
+    network: bool = False
+
+
+STAGES = [
+    Stage(
+        "fetch-unelco",
+        ("scripts/fetchUnelcoTariffReport.py",),
+        network=True,
+    ),
+    Stage(
+        "extract-unelco",
+        ("scripts/extractUnelcoTariffReportData.py",),
+        inputs=(f"{UNELCO_DIR}/*.pdf", f"{UNELCO_DIR}/*.csv"),
+        outputs=("app/electricity.csv",),
+        depends=("fetch-unelco",),
+    ),
+    Stage(
+        "fetch-ura",
+        ("scripts/fetchUraAffordabilityReports.py",),
+        network=True,
+    ),
+    Stage(
+        "extract-ura",
+        ("scripts/extractUraAffordabilityReportData.py",),
+        inputs=(f"{URA_DIR}/*.pdf",),
+        outputs=(f"{URA_DIR}/*-source.csv", f"{URA_DIR}/*-source.jpg"),
+        depends=("fetch-ura",),
+    ),
+    Stage(
+        "parse-ura",
+        ("scripts/parseUraMarketSnapshotData.py",),
+        inputs=(f"{URA_DIR}/*-source.csv",),
+        outputs=("app/ura-market-snapshots.csv",),
+        depends=("extract-ura",),
+    ),
+    Stage(
+        "fetch-wti",
+        ("scripts/fetchWtiMonthly.py",),
+        outputs=("app/crude-oil-wti.csv",),
+        network=True,
+    ),
+    Stage(
+        "fetch-wti-daily",
+        ("scripts/fetchWtiDaily.py",),
+        outputs=("app/crude-oil-wti-daily.csv",),
+        network=True,
+    ),
+    Stage(
+        "fetch-exchange-rates",
+        ("scripts/fetchCurrencyExchangeRateData.py", "--fetch-only"),
+        network=True,
+    ),
+    Stage(
+        "parse-exchange-rates",
+        ("scripts/fetchCurrencyExchangeRateData.py", "--skip-fetch"),
+        inputs=(f"{EXCHANGE_RATES_DIR}/*.html",),
+        outputs=(
+            f"{EXCHANGE_RATES_DIR}/daily.csv",
+            f"{EXCHANGE_RATES_DIR}/monthly.csv",
+            "app/exchange-rates.csv",
+            "app/exchange-rates-daily.csv",
+        ),
+        depends=("fetch-exchange-rates",),
+    ),
+    Stage(
+        "compile",
+        ("-m", "app.compiled"),
+        inputs=tuple(APP_DATA),
+        outputs=("app/compiled-data.bin",),
+        depends=APP_DATA_STAGES,
+    ),
+    Stage(
+        "build-sqlite",
+        ("-m", "app.database"),
+        inputs=tuple(APP_DATA),
+        outputs=("app/energy-data.sqlite",),
+        depends=APP_DATA_STAGES,
+    ),
+]
+if not DAILY_PRICES:
+    # nothing reads the daily prices, don't let a failed fetch fail the run
+    STAGES = [stage for stage in STAGES if stage.name != "fetch-wti-daily"]
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+
+def expand(patterns: Tuple[str, ...]) -> List[Path]:
+    return sorted(path for pattern in patterns for path in PROJECT_DIR.glob(pattern))
+
+
+def digest(patterns: Tuple[str, ...]) -> str:
+    """One hash over the names and contents of the files matching `patterns`."""
+    h = hashlib.sha256()
+    for path in expand(patterns):
+        h.update(str(path.relative_to(PROJECT_DIR)).encode())
+        h.update(file_hash(path).encode())
+    return h.hexdigest()
+
+
+def is_current(stage: Stage, state: Manifest) -> bool:
+    if stage.network or not stage.inputs:
+        return False
+    entry = state.get(stage.name)
+    return (
+        entry is not None
+        and entry["hash"] == digest(stage.inputs)
+        and entry["outputs"] == digest(stage.outputs)
+        and all(expand((pattern,)) for pattern in stage.outputs)
+    )
+
+
+def run_stage(stage: Stage) -> Tuple[int, str]:
+    proc = subprocess.run(
+        [sys.executable, *stage.command],
+        cwd=PROJECT_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    return proc.returncode, proc.stdout
+
+
+def with_dependencies(names: List[str]) -> List[Stage]:
+    selected = set()
+
+    def add(name):
+        if name not in selected:
+            selected.add(name)
+            for dependency in STAGES_BY_NAME[name].depends:
+                add(dependency)
+
+    for name in names:
+        add(name)
+    return [stage for stage in STAGES if stage.name in selected]
+
+
+def run_pipeline(
+    stages: List[Stage], state: Manifest, jobs: int, force: bool, offline: bool
+) -> Dict[str, Tuple[str, float]]:
+    """Run `stages` returning each stage's status and seconds taken."""
+    results: Dict[str, Tuple[str, float]] = {}
+    waiting = list(stages)
+    running = {}
+    started = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while waiting or running:
+            for stage in list(waiting):
+                statuses = [results.get(name, ("",))[0] for name in stage.depends]
+                if any(status in ("failed", "blocked") for status in statuses):
+                    waiting.remove(stage)
+                    results[stage.name] = ("blocked", 0.0)
+                elif all(name in results for name in stage.depends):
+                    waiting.remove(stage)
+                    if (stage.network and offline) or (
+                        not force and is_current(stage, state)
+                    ):
+                        results[stage.name] = ("skipped", 0.0)
+                        continue
+                    # hash the inputs before running so changes made meanwhile aren't missed
+                    inputs = digest(stage.inputs)
+                    started[stage.name] = time.perf_counter()
+                    running[executor.submit(run_stage, stage)] = (stage, inputs)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, inputs = running.pop(future)
+                seconds = time.perf_counter() - started[stage.name]
+                returncode, output = future.result()
+                if returncode == 0:
+                    results[stage.name] = ("ran", seconds)
+                    state.update(stage.name, inputs, outputs=digest(stage.outputs))
+                    state.save()
+                else:
+                    results[stage.name] = ("failed", seconds)
+                    click.echo(f"--- {stage.name} failed ({returncode})")
+                    click.echo(output)
+    return results
+
+
+@click.group()
+def cli():
+    """Manage the dashboard's data."""
+
+
+@cli.command()
+def stages():
+    """List the pipeline's stages in the order they can run."""
+    for stage in STAGES:
+        after = f" (after {', '.join(stage.depends)})" if stage.depends else ""
+        click.echo(f"{stage.name}{after}")
+
+
+@cli.command()
+@click.argument("names", nargs=-1, type=click.Choice(list(STAGES_BY_NAME)))
+@click.option("--offline", is_flag=True, help="Skip the stages which fetch data.")
+@click.option("--force", is_flag=True, help="Run stages even if they are up to date.")
+@click.option("--jobs", default=4, show_default=True, help="Stages run at once.")
+def run(names: Tuple[str, ...], offline: bool, force: bool, jobs: int):
+    """Run the named stages, and the stages they depend on, or the whole pipeline."""
+    selected = with_dependencies(list(names)) if names else STAGES
+    state = Manifest(STATE_FILE)
+    start = time.perf_counter()
+    results = run_pipeline(selected, state, jobs, force, offline)
+
+    click.echo(f"{'stage':<24}{'status':<10}{'seconds':>8}")
+    for stage in selected:
+        status, seconds = results[stage.name]
+        click.echo(f"{stage.name:<24}{status:<10}{seconds:>8.2f}")
+    click.echo(f"{'total':<34}{time.perf_counter() - start:>8.2f}")
+    if any(status in ("failed", "blocked") for status, _ in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,58 @@
+"""
+Compare the two-pass and single-pass URA report extraction.
+
+    python scripts/benchmarkUraExtraction.py [--limit N]
+
+The two-pass path opens the report to render it and then has camelot
+open and parse it again with its defaults. The single-pass path opens the
+report once, renders the first page and finds the source table's row label
+from that handle, and gives camelot a copy of the page cropped to the
+region around the label. Outputs are written to temporary directories
+so the bundled data isn't touched.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from extractUraAffordabilityReportData import (
+    REPORTS_DIR,
+    extract_report,
+    extract_source_figure,
+    extract_source_table,
+)
+
+
+def two_pass(fp: Path, output_dir: Path):
+    extract_source_figure(fp, output_dir)
+    extract_source_table(fp, output_dir)
+
+
+def single_pass(fp: Path, output_dir: Path):
+    extract_report(fp, output_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, help="only benchmark the first N reports")
+    args = parser.parse_args()
+
+    reports = sorted(REPORTS_DIR.glob("*.pdf"))[: args.limit]
+    totals = dict(two_pass=0.0, single_pass=0.0)
+    print(f"{'report':<12}{'two pass (s)':>14}{'single pass (s)':>17}")
+    for fp in reports:
+        timings = {}
+        for name, extract in [("two_pass", two_pass), ("single_pass", single_pass)]:
+            with tempfile.TemporaryDirectory() as output_dir:
+                start = time.perf_counter()
+                extract(fp, Path(output_dir))
+                timings[name] = time.perf_counter() - start
+            totals[name] += timings[name]
+        print(
+            f"{fp.stem:<12}{timings['two_pass']:>14.2f}{timings['single_pass']:>17.2f}"
+        )
+    print(f"{'total':<12}{totals['two_pass']:>14.2f}{totals['single_pass']:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,24 @@
-from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict, fields
 from enum import Enum
+import argparse
+import io
+import json
+import os
 import re
 import csv
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from PyPDF2 import PdfFileReader
 
+from manifest import Manifest, atomic_write_text, file_hash
+
+REPORTS_DIR = Path("data/unelco-tariff-reports")
+OUTPUT = Path("app/electricity.csv")
+# machine readable list of the reports which could not be parsed
+FAILURES = REPORTS_DIR / "failures.json"
+REPORT_NAME = re.compile(r"^\d{4}-\d{2}$")
+
 
 @dataclass(init=True, frozen=True)
 class TariffInformation:
@@ -71,37 +84,101 @@ def extract_tariff_information(lines: List[str]):
     )
 
 
-if __name__ == "__main__":
-    reports = []
-    for path in Path("data/unelco-tariff-reports").glob("*.pdf"):
-        print(f"Opening {path.name}")
+def parse_report(path: Path) -> TariffInformation:
+    if path.suffix == ".csv":
+        # reports which had to be transcribed by hand
+        with path.open("r") as f:
+            reader = csv.DictReader(f)
+            data = {k: float(v) for k, v in next(reader).items()}
+    else:
         with path.open("rb") as f:
             pdf = PdfFileReader(f)
             page = pdf.getPage(0)
             lines = page.extractText().split("\n")
-        try:
-            data = extract_tariff_information(lines)
-        except ValueError:
-            print(f"-- Failed {path.name}")
-        reports.append(
-            TariffInformation(
-                date=path.stem.strip(),
-                **data,
-            )
-        )
-    for path in Path("data/unelco-tariff-reports").glob("*.csv"):
-        print(f"Opening {path.name}")
-        with path.open("r") as f:
-            reader = csv.DictReader(f)
-            data = {k: float(v) for k, v in next(reader).items()}
-        reports.append(
-            TariffInformation(
-                date=path.stem.strip(),
-                **data,
+        data = extract_tariff_information(lines)
+    return TariffInformation(date=path.stem.strip(), **data)
+
+
+def parse_report_safely(path: Path) -> Tuple[Optional[dict], Optional[str]]:
+    """Parse a report in a worker process returning the tariffs or the error."""
+    try:
+        return asdict(parse_report(path)), None
+    except Exception as exc:
+        return None, f"{type(exc).__name__}: {exc}"
+
+
+def find_reports() -> List[Path]:
+    reports = []
+    for path in sorted(REPORTS_DIR.glob("*.pdf")) + sorted(REPORTS_DIR.glob("*.csv")):
+        if not REPORT_NAME.match(path.stem):
+            print(f"Skipping {path.name}, reports must be named YYYY-MM")
+            continue
+        reports.append(path)
+    return reports
+
+
+def write_output(tariffs: Dict[str, dict]):
+    output = io.StringIO()
+    writer = csv.DictWriter(
+        output, fieldnames=[field.name for field in fields(TariffInformation)]
+    )
+    writer.writeheader()
+    for date in sorted(tariffs):
+        writer.writerow(tariffs[date])
+    atomic_write_text(OUTPUT, output.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract the tariff rates from each Unelco tariff report."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of reports parsed in parallel (default: CPU count)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="reparse reports that are unchanged"
+    )
+    args = parser.parse_args()
+
+    manifest = Manifest(REPORTS_DIR / "manifest.json")
+    reports = find_reports()
+    # forget reports which have been removed
+    for name in set(manifest.entries) - {path.name for path in reports}:
+        manifest.remove(name)
+
+    pending = []
+    for path in reports:
+        digest = file_hash(path)
+        if args.force or not manifest.is_current(path.name, digest):
+            pending.append((path, digest))
+
+    print(f"Parsing {len(pending)} of {len(reports)} reports")
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        results = executor.map(parse_report_safely, [path for path, _ in pending])
+        for (path, digest), (tariff, error) in zip(pending, results):
+            print(f"-- Failed {path.name}" if error else f"Parsed {path.name}")
+            manifest.update(path.name, digest, tariff=tariff, error=error)
+    manifest.save()
+
+    tariffs, failures = {}, []
+    # hand transcribed csv reports come last so they replace a pdf of the same month
+    for path in reports:
+        entry = manifest.get(path.name)
+        if entry["error"]:
+            failures.append(
+                dict(file=path.name, hash=entry["hash"], error=entry["error"])
             )
-        )
-    with open("app/electricity.csv", "w") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=list(asdict(reports[0]).keys()))
-        writer.writeheader()
-        for report in sorted(reports, key=lambda i: i.date):
-            writer.writerow(asdict(report))
+        else:
+            tariffs[entry["tariff"]["date"]] = entry["tariff"]
+    atomic_write_text(FAILURES, json.dumps(failures, indent=2))
+    write_output(tariffs)
+    print(f"Wrote {len(tariffs)} months to {OUTPUT}")
+    if failures:
+        print(f"{len(failures)} reports failed, see {FAILURES}")
+
+
+if __name__ == "__main__":
+    main()
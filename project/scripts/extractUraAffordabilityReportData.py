@@ -1,24 +1,48 @@
+import argparse
+import os
+import tempfile
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 import numpy as np
 import cv2 as cv
 import camelot
+import pypdfium2 as pdfium
 from PIL import Image
-from pdf2image import convert_from_path
+
+from manifest import Manifest, file_hash
+
+REPORTS_DIR = Path("data/ura-affordability-reports")
+
+
+# assuming report doesn't change format, the energy source figure is on the first page
+# between these fractions of the page height
+FIGURE_TOP = 7 / 100
+FIGURE_BOTTOM = 45 / 100
+# DPI the first page is rendered at, pdf2image's default which the bundled
+# figures were cropped at
+RENDER_DPI = 200
+
+# camelot looks for the source table around its "Total kWh Produced" row label;
+# measured on the bundled reports the table spans from 30pt left of the label,
+# 26pt above it and 93pt below it, so these margins in PDF points keep it whole
+SOURCE_TABLE_LABEL = "Total kWh Produced"
+TABLE_MARGIN_LEFT = 60
+TABLE_MARGIN_ABOVE = 45
+TABLE_MARGIN_BELOW = 110
 
 
 def convert_image_to_cv2(img: Image) -> np.ndarray:
     return cv.cvtColor(np.array(img), cv.COLOR_RGB2BGR)
 
 
-def extract_source_figure(fp: Path):
-    # assuming report doesn't change format, the energy source figure is on the first page
-    image = convert_from_path(fp, fmt="jpg", single_file=True)[0]
-    img = convert_image_to_cv2(image)
-
+def crop_source_figure(img: np.ndarray) -> np.ndarray:
     # prepare img and crop roi
-    top_y_crop = int(img.shape[0] * (7 / 100))
-    bottom_y_crop = int(img.shape[0] * (45 / 100))
+    top_y_crop = int(img.shape[0] * FIGURE_TOP)
+    bottom_y_crop = int(img.shape[0] * FIGURE_BOTTOM)
     roi = img[top_y_crop:bottom_y_crop, 0 : img.shape[1]]  # crop top 40% of page
 
     roi_gray = cv.cvtColor(roi, cv.COLOR_BGR2GRAY)  # convert roi into gray
@@ -36,25 +60,211 @@ def extract_source_figure(fp: Path):
             cntrs.append(approx)
     largestCntr = max(cntrs, key=cv.contourArea)
     x, y, w, h = cv.boundingRect(largestCntr)
-    figure = roi[y : y + h, x : x + w]
-    # Save the figure
-    figure_fp = fp.parent / f"{fp.stem}-source.jpg"
-    cv.imwrite(str(figure_fp), figure)
+    return roi[y : y + h, x : x + w]
 
 
-def extract_source_table(fp: Path):
-    tables = camelot.read_pdf(str(fp))
+def find_source_table(tables):
     for t in tables:
         if "total kwh produced" in str(t.df).lower():
-            table_fp = fp.parent / f"{fp.stem}-source.csv"
-            t.to_csv(str(table_fp))
+            return t
+    return None
+
+
+def extract_source_figure(fp: Path, output_dir: Optional[Path] = None):
+    image = pdfium.PdfDocument(str(fp))[0].render(scale=RENDER_DPI / 72).to_pil()
+    figure = crop_source_figure(convert_image_to_cv2(image))
+    # Save the figure
+    figure_fp = (output_dir or fp.parent) / f"{fp.stem}-source.jpg"
+    cv.imwrite(str(figure_fp), figure)
+
+
+def extract_source_table(fp: Path, output_dir: Optional[Path] = None):
+    table = find_source_table(camelot.read_pdf(str(fp)))
+    if table is not None:
+        table_fp = (output_dir or fp.parent) / f"{fp.stem}-source.csv"
+        table.to_csv(str(table_fp))
+
+
+@dataclass
+class Report:
+    """
+    A report opened once with pdfium. The first page is rendered and the
+    source table located from the same handle, and camelot is given a copy
+    of just the table's part of that page rather than the whole report.
+    """
+
+    path: Path
+    document: pdfium.PdfDocument
+    # the first page, which has the source figure and table
+    page: pdfium.PdfPage
+
+    @classmethod
+    def open(cls, fp: Path) -> "Report":
+        document = pdfium.PdfDocument(str(fp))
+        return cls(path=fp, document=document, page=document[0])
+
+    def close(self):
+        self.page.close()
+        self.document.close()
+
+    def render_first_page(self) -> np.ndarray:
+        image = self.page.render(scale=RENDER_DPI / 72).to_pil()
+        return convert_image_to_cv2(image)
+
+    def source_table_region(self) -> Optional[Tuple[float, float, float, float]]:
+        """
+        The box around the source table's row label as (left, bottom, right,
+        top) in PDF points, or None if the label isn't in the page's text.
+        """
+        width, _ = self.page.get_size()
+        text = self.page.get_textpage()
+        match = text.search(SOURCE_TABLE_LABEL, match_case=False).get_next()
+        if match is None:
+            return None
+        index, count = match
+        left, bottom, _, top = text.get_charbox(index)
+        top = max(top, text.get_charbox(index + count - 1)[3])
+        return (
+            max(left - TABLE_MARGIN_LEFT, 0),
+            max(bottom - TABLE_MARGIN_BELOW, 0),
+            width,
+            top + TABLE_MARGIN_ABOVE,
+        )
+
+    def read_tables(self, table_area: Optional[str] = None):
+        """
+        Have camelot read the tables of a copy of the first page. Unless a
+        table area is given the copy is cropped to the source table's region
+        so camelot only rasterizes and searches that part of the page.
+        """
+        first_page = pdfium.PdfDocument.new()
+        first_page.import_pages(self.document, [0])
+        region = None if table_area else self.source_table_region()
+        if region is not None:
+            page = first_page[0]
+            page.set_mediabox(*region)
+            page.set_cropbox(*region)
+            page.close()
+        kwargs = dict(table_areas=[table_area]) if table_area else {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fp = Path(tmp_dir) / self.path.name
+            first_page.save(str(fp))
+            first_page.close()
+            return camelot.read_pdf(str(fp), pages="1", **kwargs)
+
+
+def extract_report(
+    fp: Path, output_dir: Optional[Path] = None, table_area: Optional[str] = None
+) -> List[Path]:
+    """
+    Extract the source figure and table from a single opening of the report,
+    returning the files written. Reports without a source table only get the
+    figure.
+    """
+    output_dir = output_dir or fp.parent
+    report = Report.open(fp)
+    try:
+        figure = crop_source_figure(report.render_first_page())
+        outputs = [output_dir / f"{fp.stem}-source.jpg"]
+        cv.imwrite(str(outputs[0]), figure)
+        table = find_source_table(report.read_tables(table_area))
+    finally:
+        report.close()
+    if table is not None:
+        outputs.append(output_dir / f"{fp.stem}-source.csv")
+        table.to_csv(str(outputs[1]))
+    return outputs
+
+
+def report_outputs(fp: Path, manifest: Manifest) -> List[Path]:
+    """The files the last extraction of `fp` wrote."""
+    entry = manifest.get(fp.name) or {}
+    # entries from before the outputs were recorded expect both
+    names = entry.get("outputs", [f"{fp.stem}-source.jpg", f"{fp.stem}-source.csv"])
+    return [fp.parent / name for name in names]
+
+
+def existing_outputs(fp: Path) -> Optional[List[Path]]:
+    """
+    The outputs of a report extracted before the manifest existed, or None
+    if it hasn't been. The figure is written before the table is looked for
+    so a newer figure on its own is a report without a table.
+    """
+    figure = fp.parent / f"{fp.stem}-source.jpg"
+    table = fp.parent / f"{fp.stem}-source.csv"
+    if not (figure.exists() and figure.stat().st_mtime >= fp.stat().st_mtime):
+        return None
+    return [figure, table] if table.exists() else [figure]
+
+
+def process_report(
+    fp: Path, table_area: Optional[str] = None
+) -> Tuple[List[Path], Optional[str]]:
+    """
+    Extract the figure and table of one report, returning the files written
+    and the error if it failed.
+    """
+    try:
+        return extract_report(fp, table_area=table_area), None
+    except Exception:
+        return [], traceback.format_exc()
 
 
 def main():
-    for path in Path("data/ura-affordability-reports").glob("*.pdf"):
-        print(f"Opening {path.name}")
-        extract_source_figure(path)
-        extract_source_table(path)
+    parser = argparse.ArgumentParser(
+        description="Extract the energy source figure and table from each URA report."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of reports processed in parallel (default: CPU count)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="reprocess reports that are unchanged"
+    )
+    parser.add_argument(
+        "--table-area",
+        help="camelot table area of the source table as 'x1,y1,x2,y2' in PDF points "
+        "(default: crop the page around the table's row label)",
+    )
+    args = parser.parse_args()
+
+    manifest = Manifest(REPORTS_DIR / "manifest.json")
+    pending: List[Tuple[Path, str]] = []
+    for path in sorted(REPORTS_DIR.glob("*.pdf")):
+        digest = file_hash(path)
+        if not args.force:
+            if manifest.is_current(path.name, digest, report_outputs(path, manifest)):
+                continue
+            outputs = existing_outputs(path)
+            if manifest.get(path.name) is None and outputs is not None:
+                # extracted before the manifest existed
+                manifest.update(path.name, digest, outputs=[o.name for o in outputs])
+                continue
+        pending.append((path, digest))
+
+    print(f"{len(pending)} reports to extract with {args.workers} workers")
+    failures = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        paths = [path for path, _ in pending]
+        results = executor.map(process_report, paths, [args.table_area] * len(paths))
+        for (path, digest), (outputs, error) in zip(pending, results):
+            if error is None:
+                no_table = "" if len(outputs) > 1 else " (no source table)"
+                print(f"Extracted {path.name}{no_table}")
+                # a report without a table is current with just its figure
+                manifest.update(path.name, digest, outputs=[o.name for o in outputs])
+            else:
+                print(f"-- Failed {path.name}")
+                failures.append((path.name, error))
+                manifest.remove(path.name)
+    manifest.save()
+
+    for name, error in failures:
+        print(f"\n== {name}\n{error}")
+    if failures:
+        raise SystemExit(f"{len(failures)} of {len(pending)} reports failed")
 
 
 if __name__ == "__main__":
@@ -1,38 +1,83 @@
 """
 Fetches monthly exchange rate from https://www.exchangerates.org.uk/VUV-USD-spot-exchange-rates-history-20xx.html
+
+    python scripts/fetchCurrencyExchangeRateData.py [--skip-fetch | --fetch-only] [--workers N] [--benchmark]
+
+Each year's page is parsed into daily and monthly rows which are cached in
+data/exchange-rates/parsed.json by the page's hash. A year's page is
+downloaded again until a copy saved after the year ended has been
+fetched, so completed years are downloaded and parsed once and usually
+only the current year's page changes between runs. `--benchmark` times
+the old full parse against this one.
 """
+import argparse
 import csv
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
-import shutil
-
-import requests
-from bs4 import BeautifulSoup
-
-BASE_URL = "https://www.exchangerates.org.uk"
-
-for year in ["2022", "2023"]:  #["2017", "2018", "2019", "2020", "2021", "2022"]:
-    resp = requests.get(f"{BASE_URL}/VUV-USD-spot-exchange-rates-history-{year}.html")
-    resp.raise_for_status()
-    html = resp.text
-    # soup = BeautifulSoup(html, "html.parser")
-    with open(
-        f"data/exchange-rates/vuv-usd-spot-exchange-rates-{year}.html", "w"
-    ) as file:
-        file.write(html)
-
-daily = csv.writer(
-    Path("data/exchange-rates/daily.csv").open("w", newline=""), delimiter=","
-)
-daily.writerow(["date", "exchange_rate"])
-monthly_file = Path("data/exchange-rates/monthly.csv")
-monthly = csv.writer(
-    monthly_file.open("w", newline=""), delimiter=","
-)
-monthly.writerow(["date", "exchange_rate"])
-
-for file in sorted(Path("data/exchange-rates").glob("*.html")):
-    soup = BeautifulSoup(file.open("r").read(), "html.parser")
+from typing import Dict, List, Tuple
+
+from fetching import Fetcher, FetchStatus, base_url, print_results
+from manifest import Manifest, atomic_write_text, file_hash
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+BASE_URL = base_url("EXCHANGE_RATES_BASE_URL", "https://www.exchangerates.org.uk")
+DATA_DIR = Path("data/exchange-rates")
+FIRST_YEAR = 2017
+
+Rows = Tuple[List[list], List[list]]
+
+
+def page_path(year: int) -> Path:
+    return DATA_DIR / f"vuv-usd-spot-exchange-rates-{year}.html"
+
+
+def is_complete(year: int) -> bool:
+    """Whether the saved page for `year` was fetched after that year ended."""
+    path = page_path(year)
+    if not path.exists():
+        return False
+    return path.stat().st_mtime >= datetime(year + 1, 1, 1).timestamp()
+
+
+def fetch_pages(current_year: int):
+    years = range(FIRST_YEAR, current_year + 1)
+    downloads = {
+        year: (
+            f"{BASE_URL}/VUV-USD-spot-exchange-rates-history-{year}.html",
+            page_path(year),
+        )
+        for year in years
+    }
+    # a page saved before its year ended is missing its last months so it's
+    # revalidated along with the current year, a 304 if it hasn't changed
+    complete = [year for year in years if is_complete(year)]
+    incomplete = [year for year in years if year not in complete]
+    with Fetcher(DATA_DIR / "downloads.json") as fetcher:
+        results = fetcher.download_all(downloads[year] for year in complete)
+        refreshed = fetcher.download_all(
+            (downloads[year] for year in incomplete), refresh=True
+        )
+    for year, result in zip(incomplete, refreshed):
+        if result.status is FetchStatus.NOT_MODIFIED and year < current_year:
+            # confirmed unchanged since the year ended, so it's complete
+            result.path.touch()
+    print_results(results + refreshed)
+
+
+def parse_page_soup(html: str) -> Rows:
+    from bs4 import BeautifulSoup
+
+    daily, monthly = [], []
+    soup = BeautifulSoup(html, "html.parser")
     for h3 in soup.find("div", {"id": "hd-maintable"}).find_all("h3"):
         date = datetime.strptime(h3.text, "%B %Y")
         table = h3.find_next_sibling("table")
@@ -40,14 +85,135 @@ for file in sorted(Path("data/exchange-rates").glob("*.html")):
         for row in dailyrows:
             dt = datetime.strptime(row.td.text.split(" ", 1)[1].strip(), "%d %B %Y")
             rate = float(row.find_all("td")[1].text.split("$")[1])
-            daily.writerow([dt.strftime("%Y-%m-%d"), rate])
+            daily.append([dt.strftime("%Y-%m-%d"), rate])
         monthlyrow = table.find_all("tr")[-1]
         average = float(monthlyrow.td.text.rsplit(":", 1)[-1].strip())
-        monthly.writerow([date.strftime("%Y-%m"), average])
+        monthly.append([date.strftime("%Y-%m"), average])
+    return daily, monthly
+
+
+def parse_page_lxml(html: str) -> Rows:
+    daily, monthly = [], []
+    root = lxml.html.fromstring(html)
+    for h3 in root.xpath('//div[@id="hd-maintable"]//h3'):
+        date = datetime.strptime(h3.text_content(), "%B %Y")
+        table = h3.xpath("following-sibling::table[1]")[0]
+        rows = table.xpath(".//tr")
+        for row in rows[1:-1]:
+            cells = row.xpath("td")
+            day = cells[0].text_content().split(" ", 1)[1].strip()
+            dt = datetime.strptime(day, "%d %B %Y")
+            rate = float(cells[1].text_content().split("$")[1])
+            daily.append([dt.strftime("%Y-%m-%d"), rate])
+        average = rows[-1].xpath("td")[0].text_content().rsplit(":", 1)[-1].strip()
+        monthly.append([date.strftime("%Y-%m"), float(average)])
+    return daily, monthly
+
+
+def parse_page(path: Path) -> Rows:
+    html = path.read_text()
+    # lxml is roughly 9x faster, html.parser is kept for when it isn't installed
+    if lxml is not None:
+        return parse_page_lxml(html)
+    return parse_page_soup(html)
+
+
+def parse_pages(paths: List[Path], manifest: Manifest, workers: int) -> Dict[str, Rows]:
+    """Parse the pages which changed since they were cached in `manifest`."""
+    digests = {path: file_hash(path) for path in paths}
+    pending = [
+        path for path in paths if not manifest.is_current(path.name, digests[path])
+    ]
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, (daily, monthly) in zip(
+                pending, executor.map(parse_page, pending)
+            ):
+                manifest.update(path.name, digests[path], daily=daily, monthly=monthly)
+    for name in set(manifest.entries) - {path.name for path in paths}:
+        manifest.remove(name)
+    return {
+        path.name: (
+            manifest.get(path.name)["daily"],
+            manifest.get(path.name)["monthly"],
+        )
+        for path in paths
+    }
+
+
+def write_rows(path: Path, rows: List[list]):
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=",")
+    writer.writerow(["date", "exchange_rate"])
+    writer.writerows(rows)
+    atomic_write_text(path, output.getvalue())
+
+
+def benchmark(paths: List[Path], workers: int):
+    def timed(parse) -> float:
+        start = time.perf_counter()
+        parse()
+        return time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = Manifest(Path(tmp) / "parsed.json")
+        timings = [
+            (
+                "html.parser, serial",
+                timed(lambda: [parse_page_soup(p.read_text()) for p in paths]),
+            ),
+            ("lxml, parallel", timed(lambda: parse_pages(paths, manifest, workers))),
+            ("cached", timed(lambda: parse_pages(paths, manifest, workers))),
+        ]
+        # a new year of rates only invalidates the current year's page
+        manifest.update(paths[-1].name, "")
+        timings.append(
+            (
+                "current year changed",
+                timed(lambda: parse_pages(paths, manifest, workers)),
+            )
+        )
+    print(f"parsing {len(paths)} pages (s)")
+    for name, seconds in timings:
+        print(f"  {name:<24}{seconds:>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--skip-fetch", action="store_true", help="only parse the saved pages"
+    )
+    parser.add_argument(
+        "--fetch-only", action="store_true", help="download the pages without parsing"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--benchmark", action="store_true")
+    args = parser.parse_args()
+
+    if not (args.skip_fetch or args.benchmark):
+        fetch_pages(datetime.now().year)
+    if args.fetch_only:
+        return
+
+    paths = sorted(DATA_DIR.glob("*.html"))
+    if args.benchmark:
+        benchmark(paths, args.workers)
+        return
+
+    manifest = Manifest(DATA_DIR / "parsed.json")
+    pages = parse_pages(paths, manifest, args.workers)
+    manifest.save()
+
+    daily_rows = [row for daily, _ in pages.values() for row in daily]
+    monthly_rows = [row for _, monthly in pages.values() for row in monthly]
+    write_rows(DATA_DIR / "daily.csv", daily_rows)
+    write_rows(DATA_DIR / "monthly.csv", monthly_rows)
+
+    # monthly data for the app, written rather than copied so a running app never reads a partial file - later we should process the exchange rate info in place with the electricity price data rather than doing that work in the app
+    write_rows(Path("app/exchange-rates.csv"), monthly_rows)
+    # the daily rates are only loaded for DAILY_PRICES
+    write_rows(Path("app/exchange-rates-daily.csv"), daily_rows)
 
-daily.close()
-monthly.close()
 
-# copy monthly data to app - later we should process the exchange rate info in place with the electricity price data rather than doing that work in the app
-tmp_file_for_app = Path("app/exchange-rates.csv")
-shutil.copy(monthly_file, tmp_file_for_app)
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,46 @@
 """
 Fetch Unelco's latest electricity tariff report.
 Unelco will also provide via email upon request (not any longer).
+
+The last download is kept in `latest/` so the next fetch can send its
+validators and an unchanged report costs a 304. A report we don't have yet
+is copied to downloaded.pdf to be checked and renamed YYYY-MM.pdf.
 """
+import shutil
 from pathlib import Path
-import requests
 
-output = Path("data/unelco-tariff-reports/downloaded.pdf")
+from fetching import Fetcher, FetchStatus, base_url
+from manifest import file_hash
+
+REPORTS_DIR = Path("data/unelco-tariff-reports")
+LATEST = REPORTS_DIR / "latest" / "electricityrate.pdf"
+output = REPORTS_DIR / "downloaded.pdf"
 if output.exists():
-    raise RuntimeError("Output file currently exists.")
+    # not an error so the pipeline can carry on with the reports we do have
+    print("downloaded.pdf still needs to be checked and renamed YYYY-MM.pdf")
+    raise SystemExit(0)
 
-URL = "https://www.unelco.engie.com/images/doc/electricityrate.pdf"
-resp = requests.get(URL)
-resp.raise_for_status()
-output.write_bytes(resp.content)
+URL = base_url(
+    "UNELCO_URL", "https://www.unelco.engie.com/images/doc/electricityrate.pdf"
+)
+LATEST.parent.mkdir(parents=True, exist_ok=True)
+with Fetcher(LATEST.parent / "downloads.json") as fetcher:
+    result = fetcher.download(URL, LATEST, refresh=True)
+if result.status is FetchStatus.NOT_MODIFIED:
+    print("Latest report is unchanged since the last fetch")
+    raise SystemExit(0)
 
-# User must check file is new and give YYYY-MM.pdf filename.
-print("Check downloaded.pdf and rename YYYY-MM.pdf")
\ No newline at end of file
+# the report is only updated every so often so it may be one we already have
+digest = file_hash(LATEST)
+existing = next(
+    (path for path in REPORTS_DIR.glob("*.pdf") if file_hash(path) == digest),
+    None,
+)
+if existing is not None:
+    print(f"Latest report is already saved as {existing.name}")
+else:
+    part = output.with_name(f"{output.name}.part")
+    shutil.copyfile(LATEST, part)
+    part.replace(output)
+    # User must check file is new and give YYYY-MM.pdf filename.
+    print("Check downloaded.pdf and rename YYYY-MM.pdf")
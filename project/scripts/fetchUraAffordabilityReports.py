@@ -4,17 +4,17 @@ Fetches monthly affordability reports from http://ura.gov.vu/index.php/services/
 
 from datetime import datetime
 from pathlib import Path
-import shutil
 
-import requests
 from bs4 import BeautifulSoup
 
-URA_BASE_URL = "http://ura.gov.vu"
-resp = requests.get(
+from fetching import Fetcher, base_url, print_results
+
+URA_BASE_URL = base_url("URA_BASE_URL", "http://ura.gov.vu")
+save_path = Path("data/ura-affordability-reports")
+fetcher = Fetcher(save_path / "downloads.json")
+html = fetcher.get_text(
     f"{URA_BASE_URL}/index.php/services/regulated-services/electricity-services/affordability"
 )
-resp.raise_for_status()
-html = resp.text
 soup = BeautifulSoup(html, "html.parser")
 
 
@@ -34,10 +34,10 @@ for p_tag in soup.find_all("p"):
         downloads.append((url, date))
 
 
-save_path = Path("data/ura-affordability-reports")
-for uri, date in downloads:
-    report_file = save_path / datetime.strftime(date, "%Y-%m.pdf")
-    # https://stackoverflow.com/a/39217788
-    with requests.get(f"{URA_BASE_URL}{uri}", stream=True) as r:
-        with report_file.open("wb") as f:
-            shutil.copyfileobj(r.raw, f)
+# published reports don't change so only the new ones are downloaded
+with fetcher:
+    results = fetcher.download_all(
+        (f"{URA_BASE_URL}{uri}", save_path / datetime.strftime(date, "%Y-%m.pdf"))
+        for uri, date in downloads
+    )
+print_results(results)
@@ -0,0 +1,13 @@
+"""
+Fetch WTI daily oil prices in USD for the app's DAILY_PRICES mode.
+"""
+from pathlib import Path
+
+from fetching import base_url
+from wti import fetch_prices
+
+URL = base_url(
+    "WTI_DAILY_URL",
+    "https://raw.githubusercontent.com/datasets/oil-prices/master/data/wti-daily.csv",
+)
+fetch_prices(URL, Path("app/crude-oil-wti-daily.csv"))
@@ -0,0 +1,205 @@
+"""
+Shared download layer for the fetch scripts.
+
+A `Fetcher` keeps one pooled `requests.Session` and downloads on a small
+thread pool. Files that already exist are skipped unless they are
+refreshed, refreshes send the ETag / Last-Modified validators recorded by
+the previous download so an unchanged file costs a 304, interrupted
+downloads resume from their `.part` file with a Range request and
+failures are retried with exponential backoff.
+
+Validators are kept in the `Manifest` passed as `state`, the scripts keep
+a `downloads.json` next to the files they download. Each script reads its
+base URL from the environment so it can be pointed at a local stand-in
+server, e.g.
+
+    URA_BASE_URL=http://localhost:8000 python scripts/fetchUraAffordabilityReports.py
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from manifest import Manifest, file_hash
+
+CHUNK_SIZE = 64 * 1024
+# responses worth asking for again, anything else is raised straight away
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def base_url(name: str, default: str) -> str:
+    return os.environ.get(name, default).rstrip("/")
+
+
+class FetchStatus(Enum):
+    DOWNLOADED = "downloaded"
+    RESUMED = "resumed"
+    NOT_MODIFIED = "not modified"
+    SKIPPED = "skipped"
+
+
+@dataclass
+class FetchResult:
+    url: str
+    path: Path
+    status: FetchStatus
+    bytes: int = 0
+
+
+class RetryableError(Exception):
+    pass
+
+
+class Fetcher:
+    def __init__(
+        self,
+        state: Optional[Path] = None,
+        max_workers: int = 4,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 30,
+    ):
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.manifest = Manifest(state) if state else None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.manifest is not None:
+            self.manifest.save()
+        self.session.close()
+
+    def get_text(self, url: str) -> str:
+        return self._with_retries(lambda: self._get(url).text)
+
+    def download(self, url: str, path: Path, refresh: bool = False) -> FetchResult:
+        """
+        Download `url` to `path`. Existing files are skipped unless `refresh`
+        is set in which case the server is asked whether they have changed.
+        """
+        if path.exists() and not refresh:
+            return FetchResult(url, path, FetchStatus.SKIPPED)
+        return self._with_retries(lambda: self._download(url, path))
+
+    def download_all(
+        self, downloads: Iterable[Tuple[str, Path]], refresh: bool = False
+    ) -> List[FetchResult]:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self.download, url, path, refresh)
+                for url, path in downloads
+            ]
+            return [future.result() for future in futures]
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        try:
+            resp = self.session.get(url, timeout=self.timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            raise RetryableError(str(exc)) from exc
+        if resp.status_code in RETRY_STATUSES:
+            resp.close()
+            raise RetryableError(f"{resp.status_code} from {url}")
+        resp.raise_for_status()
+        return resp
+
+    def _with_retries(self, attempt):
+        for retry in range(self.retries + 1):
+            try:
+                return attempt()
+            except RetryableError:
+                if retry == self.retries:
+                    raise
+                time.sleep(self.backoff * 2**retry)
+
+    def _validators(self, path: Path) -> dict:
+        if self.manifest is None:
+            return {}
+        with self._lock:
+            return dict(self.manifest.get(path.name) or {})
+
+    def _download(self, url: str, path: Path) -> FetchResult:
+        validators = self._validators(path)
+        part = path.with_name(f"{path.name}.part")
+        offset = part.stat().st_size if part.exists() else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            # only resume if the file hasn't changed since the part was written
+            if validators.get("etag"):
+                headers["If-Range"] = validators["etag"]
+        elif path.exists():
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        try:
+            resp = self._get(url, headers=headers, stream=True)
+        except requests.HTTPError as exc:
+            if exc.response.status_code != 416 or not offset:
+                raise
+            # the part file doesn't match the server's copy so start over
+            part.unlink()
+            raise RetryableError(f"416 from {url}") from exc
+        with resp:
+            if resp.status_code == 304:
+                return FetchResult(url, path, FetchStatus.NOT_MODIFIED)
+            resumed = resp.status_code == 206
+            written = self._write(resp, part, append=resumed)
+
+        part.replace(path)
+        if self.manifest is not None:
+            with self._lock:
+                self.manifest.update(
+                    path.name,
+                    file_hash(path),
+                    url=url,
+                    etag=resp.headers.get("ETag"),
+                    last_modified=resp.headers.get("Last-Modified"),
+                )
+        status = FetchStatus.RESUMED if resumed else FetchStatus.DOWNLOADED
+        return FetchResult(url, path, status, written)
+
+    @staticmethod
+    def _write(resp: requests.Response, part: Path, append: bool) -> int:
+        written = 0
+        # whatever arrived is kept in the part file for the next attempt
+        with part.open("ab" if append else "wb") as f:
+            try:
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+            except (
+                requests.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+            ) as exc:
+                raise RetryableError(str(exc)) from exc
+        return written
+
+
+def print_results(results: List[FetchResult]):
+    for result in results:
+        if result.status is not FetchStatus.SKIPPED:
+            print(f"{result.status.value:<14}{result.path.name} ({result.bytes} bytes)")
+    skipped = sum(result.status is FetchStatus.SKIPPED for result in results)
+    if skipped:
+        print(f"{'skipped':<14}{skipped} files which already exist")
@@ -0,0 +1,58 @@
+"""
+Manifest of the files an ETL script has already processed.
+
+Each entry is keyed by the input file name and records the input's
+content hash plus whatever the script wants to remember about it (the
+outputs it wrote, parsed values, ...). Scripts use it to skip inputs
+that haven't changed since the last run.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def atomic_write_text(path: Path, text: str):
+    # write next to the destination then rename so readers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", newline="") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class Manifest:
+    def __init__(self, path: Path):
+        self.path = path
+        try:
+            self.entries = json.loads(path.read_text())
+        except FileNotFoundError:
+            self.entries = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        return self.entries.get(key)
+
+    def is_current(self, key: str, digest: str, outputs: Iterable[Path] = ()) -> bool:
+        """Whether `key` was processed at `digest` and its outputs still exist."""
+        entry = self.entries.get(key)
+        if entry is None or entry.get("hash") != digest:
+            return False
+        return all(path.exists() for path in outputs)
+
+    def update(self, key: str, digest: str, **values):
+        self.entries[key] = dict(hash=digest, **values)
+
+    def remove(self, key: str):
+        self.entries.pop(key, None)
+
+    def save(self):
+        atomic_write_text(self.path, json.dumps(self.entries, indent=2, sort_keys=True))
@@ -1,9 +1,13 @@
 import csv
 import math
+import sys
 from datetime import datetime
 from pathlib import Path
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.schema import LOCATION_ALIASES
+
 
 def parse_ura_source_table(df):
     date = datetime.strptime(df.columns[0], "%b-%y")
@@ -51,9 +55,11 @@ def main():
                         kwh = kwh_produced_percent * total_kwh_produced
                     else:
                         kwh = None
+                    # reports use different names for some locations over the years
+                    name = location.strip().replace("\n", "").replace("*", "")
                     row = dict(
                         date=date.strftime("%Y-%m"),
-                        location=location.strip().replace("\n", "").replace("*", ""),
+                        location=LOCATION_ALIASES.get(name, name),
                         source=source.replace("%", "").strip(),
                         kwh=kwh,
                     )
@@ -0,0 +1,185 @@
+"""
+The fetch layer against a local `http.server` stand-in.
+
+    python -m pytest scripts
+
+Each test scripts the stand-in's responses and checks what the `Fetcher`
+sent and saved: revalidation with the recorded validators, resuming a
+`.part` file, starting over when the server won't resume and retrying
+throttled or failing responses with backoff.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fetching
+from fetching import Fetcher, FetchStatus, RetryableError
+
+BODY = bytes(range(256)) * 64
+ETAG = '"v1"'
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Serves BODY, or the statuses queued in `server.failures` first."""
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.server.failures:
+            self.send_response(self.server.failures.pop(0))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        ranged = self.headers.get("Range")
+        if ranged and self.server.ranges and self.headers.get("If-Range") == ETAG:
+            start = int(ranged.split("=")[1].rstrip("-"))
+            if start >= len(BODY):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            end = len(BODY) - 1
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(BODY)}")
+            body = BODY[start:]
+        else:
+            # a server which ignores the range sends the whole file
+            self.send_response(200)
+            body = BODY
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.requests = []
+    server.failures = []
+    server.ranges = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def url(server):
+    return f"http://127.0.0.1:{server.server_port}/rates.html"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """The backoff delays, without waiting for them."""
+    delays = []
+    monkeypatch.setattr(fetching.time, "sleep", delays.append)
+    return delays
+
+
+def fetcher(tmp_path, **kwargs):
+    return Fetcher(tmp_path / "downloads.json", max_workers=2, **kwargs)
+
+
+def test_refresh_revalidates(server, url, tmp_path):
+    path = tmp_path / "rates.html"
+    with fetcher(tmp_path) as f:
+        first = f.download(url, path)
+        skipped = f.download(url, path)
+        refreshed = f.download(url, path, refresh=True)
+
+    assert first.status is FetchStatus.DOWNLOADED
+    assert first.bytes == len(BODY)
+    assert skipped.status is FetchStatus.SKIPPED
+    assert refreshed.status is FetchStatus.NOT_MODIFIED
+    assert server.requests[-1]["If-None-Match"] == ETAG
+    assert path.read_bytes() == BODY
+
+
+def test_resumes_part_file(server, url, tmp_path):
+    path = tmp_path / "rates.html"
+    with fetcher(tmp_path) as f:
+        f.download(url, path)
+    path.with_name("rates.html.part").write_bytes(BODY[:1000])
+    path.unlink()
+
+    with fetcher(tmp_path) as f:
+        result = f.download(url, path)
+
+    assert result.status is FetchStatus.RESUMED
+    assert result.bytes == len(BODY) - 1000
+    assert server.requests[-1]["Range"] == "bytes=1000-"
+    assert path.read_bytes() == BODY
+    assert not path.with_name("rates.html.part").exists()
+
+
+def test_restarts_after_416(server, url, tmp_path, sleeps):
+    path = tmp_path / "rates.html"
+    with fetcher(tmp_path) as f:
+        f.download(url, path)
+    # longer than the server's copy so the range can't be satisfied
+    path.with_name("rates.html.part").write_bytes(BODY + b"stale")
+    path.unlink()
+
+    with fetcher(tmp_path) as f:
+        result = f.download(url, path)
+
+    assert result.status is FetchStatus.DOWNLOADED
+    assert server.requests[-2]["Range"] == f"bytes={len(BODY) + 5}-"
+    assert "Range" not in server.requests[-1]
+    assert len(sleeps) == 1
+    assert path.read_bytes() == BODY
+
+
+def test_restarts_when_range_ignored(server, url, tmp_path):
+    server.ranges = False
+    path = tmp_path / "rates.html"
+    path.with_name("rates.html.part").write_bytes(b"not the start of the file")
+
+    with fetcher(tmp_path) as f:
+        result = f.download(url, path)
+
+    assert result.status is FetchStatus.DOWNLOADED
+    assert path.read_bytes() == BODY
+
+
+def test_retries_with_backoff(server, url, tmp_path, sleeps):
+    server.failures = [429, 503, 500]
+    path = tmp_path / "rates.html"
+
+    with fetcher(tmp_path, retries=3, backoff=0.5) as f:
+        result = f.download(url, path)
+
+    assert result.status is FetchStatus.DOWNLOADED
+    assert len(server.requests) == 4
+    assert sleeps == [0.5, 1.0, 2.0]
+    assert path.read_bytes() == BODY
+
+
+def test_gives_up_after_retries(server, url, tmp_path, sleeps):
+    server.failures = [503] * 3
+    path = tmp_path / "rates.html"
+
+    with fetcher(tmp_path, retries=2) as f, pytest.raises(RetryableError):
+        f.download(url, path)
+
+    assert len(server.requests) == 3
+    assert not path.exists()
+
+
+def test_other_errors_are_not_retried(server, url, tmp_path, sleeps):
+    server.failures = [404]
+
+    with fetcher(tmp_path) as f, pytest.raises(fetching.requests.HTTPError):
+        f.get_text(url)
+
+    assert len(server.requests) == 1
+    assert sleeps == []
@@ -0,0 +1,35 @@
+"""
+WTI oil prices in USD from https://github.com/datasets/oil-prices, shared
+by the monthly and daily fetch scripts.
+"""
+import csv
+from datetime import datetime
+from io import StringIO
+from pathlib import Path
+
+from fetching import Fetcher
+from manifest import atomic_write_text
+
+START_DATETIME = datetime(2019, 1, 1)  # earliest date we have local data to compare against
+
+
+def fetch_prices(url: str, path: Path):
+    """Write the prices at `url` since START_DATETIME to `path` as date,price rows."""
+    with Fetcher() as fetcher:
+        text = fetcher.get_text(url)
+
+    output = StringIO()
+    writer = csv.writer(output, delimiter=",")
+    writer.writerow(["date", "price"])
+    with StringIO(text) as csv_file:
+        fieldnames = ["Date", "Price"]
+        reader = csv.DictReader(csv_file, fieldnames=fieldnames, delimiter=",")
+        next(reader)  # skip the header
+        for row in reader:
+            dt = datetime.strptime(row["Date"], "%Y-%m-%d")
+            # the daily series has no price on some holidays
+            if dt < START_DATETIME or not row["Price"]:
+                continue
+            writer.writerow(list(row.values()))
+    # the app may be watching the file for changes so never leave it half written
+    atomic_write_text(path, output.getvalue())